@@ -0,0 +1,246 @@
+# Пакетная сборка AR-сцен без интерфейса.
+#
+# Драйвер (обычный Python) раздаёт задания пулу фоновых Blender-процессов,
+# по одному на ядро, следит за таймаутами и пишет сводку:
+#   python ar_batch.py manifest.json --blender /path/to/blender --out results
+#
+# Воркер (его запускает драйвер, по процессу на задание):
+#   blender -b --factory-startup --python ar_batch.py -- --worker results/<job>/job.json
+#
+# Манифест — JSON-список объектов или CSV с заголовком. Поля задания:
+#   prompt  — запрос модели (обязательно)
+#   video   — видео для фона (обязательно)
+#   hdri    — HDRI окружение
+#   camera  — тип облёта newDome.py (CINEMATIC, FIGURE8, VERT_HELIX, TRIANGLE)
+#   name    — имя каталога результата (по умолчанию номер и запрос)
+#   export  — 1/true: сохранить рядом GLB для телефона (newDome.py)
+#   ar_*    — любые свойства сцены аддона, например ar_import_mode или ar_lod_budget
+#
+# Модели качаются в общий кэш AR_CACHE_DIR; одинаковые запросы разных воркеров
+# скачиваются один раз (блокировка на файл в download_model_from_sketchfab).
+import argparse
+import concurrent.futures
+import csv
+import importlib
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ---------------------------
+# Манифест
+# ---------------------------
+def _parse_flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def load_manifest(path):
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            # Пустая ячейка — поле не задано; типы ar_* приводит воркер по свойствам сцены
+            jobs = [{k: v for k, v in row.items() if k and v not in ("", None)}
+                    for row in csv.DictReader(f)]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            jobs = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    for i, job in enumerate(jobs):
+        if not job.get("prompt") or not job.get("video"):
+            raise ValueError(f"Задание {i}: нужны поля prompt и video")
+        for key in ("video", "hdri"):
+            if job.get(key):
+                job[key] = os.path.join(base, job[key])
+        slug = re.sub(r"[^\w-]+", "_", str(job["prompt"])).strip("_")[:40]
+        job.setdefault("name", f"{i:04d}_{slug}")
+        job["export"] = _parse_flag(job.get("export", False))
+    return jobs
+
+
+# ---------------------------
+# Драйвер
+# ---------------------------
+def run_job(job, blender, out_dir, addon, timeout):
+    job_dir = os.path.join(out_dir, job["name"])
+    os.makedirs(job_dir, exist_ok=True)
+    job = dict(job, addon=job.get("addon", addon), out_dir=job_dir,
+               blend=os.path.join(job_dir, "scene.blend"))
+    job_path    = os.path.join(job_dir, "job.json")
+    result_path = os.path.join(job_dir, "result.json")
+    with open(job_path, "w", encoding="utf-8") as f:
+        json.dump(job, f, ensure_ascii=False, indent=2)
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    cmd = [blender, "-b", "--factory-startup", "--python-exit-code", "1",
+           "--python", os.path.abspath(__file__), "--", "--worker", job_path]
+    start = time.perf_counter()
+    with open(os.path.join(job_dir, "blender.log"), "w", encoding="utf-8") as log:
+        try:
+            proc = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT, timeout=timeout)
+            returncode = proc.returncode
+        except subprocess.TimeoutExpired:
+            return {"name": job["name"], "status": "timeout",
+                    "seconds": time.perf_counter() - start, "error": f"дольше {timeout} с"}
+    try:
+        with open(result_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        result = {"status": "error", "error": f"воркер завершился с кодом {returncode}, см. blender.log"}
+    result.update(name=job["name"], seconds=time.perf_counter() - start)
+    return result
+
+
+def run_batch(jobs, blender, out_dir, addon="newDome", workers=None, timeout=1800):
+    workers = workers or os.cpu_count() or 1
+    results = []
+    # Потоки только ждут дочерние процессы Blender: по одному процессу на ядро
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, job, blender, out_dir, addon, timeout) for job in jobs]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), start=1):
+            result = future.result()
+            results.append(result)
+            print(f"[{done}/{len(jobs)}] {result['name']}: {result['status']} "
+                  f"за {result['seconds']:.1f} с" + (f" — {result['error']}" if result.get("error") else ""),
+                  flush=True)
+    order = {job["name"]: i for i, job in enumerate(jobs)}
+    results.sort(key=lambda r: order[r["name"]])
+    return results
+
+
+def print_summary(results, elapsed):
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    busy = sum(r["seconds"] for r in results)
+    print(f"\nЗаданий: {len(results)} · " + ", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    print(f"Время: {elapsed:.1f} с, суммарно по воркерам {busy:.1f} с")
+    for r in results:
+        if r["status"] != "ok":
+            print(f"  {r['name']}: {r['status']} — {r.get('error', '')}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Пакетная сборка AR-сцен в фоновом Blender")
+    parser.add_argument("manifest", help="JSON или CSV со списком заданий")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"))
+    parser.add_argument("--out", default="ar_batch_results", help="каталог результатов")
+    parser.add_argument("--addon", default="newDome", choices=("newDome", "new"))
+    parser.add_argument("--workers", type=int, default=None, help="процессов Blender (по умолчанию — по числу ядер)")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="таймаут одного задания, с")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    out_dir = os.path.abspath(args.out)
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = run_batch(jobs, args.blender, out_dir, args.addon, args.workers, args.timeout)
+    elapsed = time.perf_counter() - start
+    with open(os.path.join(out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump({"elapsed": elapsed, "results": results}, f, ensure_ascii=False, indent=2)
+    print_summary(results, elapsed)
+    return 0 if all(r["status"] == "ok" for r in results) else 1
+
+
+# ---------------------------
+# Воркер (внутри Blender)
+# ---------------------------
+def coerce_property(scene, key, value):
+    # Значение из манифеста (строка из CSV или JSON-тип) приводится к типу RNA-свойства сцены
+    try:
+        prop = scene.bl_rna.properties[key]
+    except KeyError:
+        raise ValueError(f"Неизвестное свойство сцены: {key}") from None
+    if getattr(prop, "is_array", False):
+        items = re.split(r"[\s,;]+", value.strip()) if isinstance(value, str) else list(value)
+        return [_coerce_scalar(prop, key, item) for item in items]
+    return _coerce_scalar(prop, key, value)
+
+
+def _coerce_scalar(prop, key, value):
+    try:
+        if prop.type == 'BOOLEAN':
+            return _parse_flag(value)
+        if prop.type == 'INT':
+            return int(value)
+        if prop.type == 'FLOAT':
+            number = float(value)
+            if not math.isfinite(number):
+                raise ValueError(value)
+            return number
+    except ValueError:
+        raise ValueError(f"{key}: ожидалось {prop.type}, получено {value!r}") from None
+    return value if isinstance(value, str) else str(value)
+
+
+def build_job(job):
+    import bpy
+
+    sys.path.insert(0, REPO_DIR)
+    addon = importlib.import_module(job["addon"])
+    addon.register()
+    try:
+        scene = bpy.context.scene
+        scene.ar_prompt     = job["prompt"]
+        scene.ar_video_path = job["video"]
+        scene.ar_hdri_path  = job.get("hdri") or ""
+        for key, value in job.items():
+            if key.startswith("ar_") and value not in ("", None):
+                setattr(scene, key, coerce_property(scene, key, value))
+        if not addon.video_is_valid(scene.ar_video_path):
+            raise RuntimeError(f"Некорректный видеофайл: {scene.ar_video_path}")
+
+        # Тип облёта уходит прямо в стадию camera, чтобы камера строилась один раз
+        options = {}
+        camera = job.get("camera")
+        if camera and hasattr(addon, "apply_camera_animation"):
+            scene.ar_camera_anim_type = camera
+            options["camera_anim"] = scene.ar_camera_anim_type
+
+        profiler = addon.BuildProfiler(scene.ar_prompt)
+        model_path = addon.profiled_download(profiler, scene.ar_prompt, **addon.resolve_options(scene))
+        result = addon.build_scene_stages(bpy.context, model_path, force=True, profiler=profiler, **options)
+        root = result["root"]
+
+        # Профиль сохраняется до записи .blend, чтобы последний прогон был и в сцене
+        profile = addon.save_profile(scene, profiler)
+        bpy.ops.wm.save_as_mainfile(filepath=job["blend"])
+        summary = {"status": "ok", "blend": job["blend"], "model": model_path,
+                   "report": addon.build_report(scene, "AR сцена создана", result),
+                   "profile": profile}
+        if job.get("export") and hasattr(addon, "export_all"):
+            info = addon.export_all(root, scene, export_dir=job["out_dir"])
+            summary["glb"] = info["path"]
+        return summary
+    finally:
+        addon.unregister()
+
+
+def worker(job_path):
+    with open(job_path, "r", encoding="utf-8") as f:
+        job = json.load(f)
+    try:
+        result = build_job(job)
+    except Exception as e:
+        result = {"status": "error", "error": str(e), "traceback": traceback.format_exc()}
+    with open(os.path.join(os.path.dirname(job_path), "result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0 if result["status"] == "ok" else 1
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    if argv[:1] == ["--worker"]:
+        code = worker(argv[1])
+        if code:
+            sys.exit(code)
+    else:
+        sys.exit(main(argv))
@@ -0,0 +1,269 @@
+# Параллельный рендер собранной сцены кусками кадров.
+#
+# Драйвер делит диапазон кадров на куски и рендерит каждый в отдельном фоновом
+# Blender-процессе на этой же машине, сам собирает секвенцию и, если найден
+# ffmpeg, видео:
+#   python ar_render.py results/0000_robot/scene.blend --blender /path/to/blender \
+#       --out renders/robot --video renders/robot.mp4
+#
+# Размер куска подбирается по ходу рендера: первые куски из --probe кадров
+# измеряют время кадра и накладные расходы запуска Blender, дальше кусок
+# выбирается так, чтобы запуск занимал не больше OVERHEAD_SHARE его времени,
+# но хвост всё равно делился между всеми процессами. Упавшие куски
+# перезапускаются (только недостающие кадры), уже готовые кадры пропускаются.
+#
+# Воркер (его запускает драйвер):
+#   blender -b scene.blend --python ar_render.py -- --worker 1-24 <каталог кадров> <timings.json>
+import argparse
+import concurrent.futures
+import glob
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+OVERHEAD_SHARE = 0.1  # доля запуска Blender во времени куска
+FRAME_PREFIX   = "frame_"
+
+
+# ---------------------------
+# Планировщик кусков
+# ---------------------------
+class ChunkScheduler:
+    def __init__(self, frames, workers, probe=2, max_chunk=None, retries=2):
+        self.pending   = list(frames)
+        self.workers   = workers
+        self.probe     = probe
+        self.max_chunk = max_chunk
+        self.retries   = retries
+        self.attempts  = {}   # кадр -> число неудачных попыток
+        self.failed    = []
+        self.in_flight = 0
+        self.per_frame = None  # средние секунды на кадр
+        self.overhead  = None  # секунды на запуск процесса и загрузку сцены
+        self._samples  = []
+        self._cond     = threading.Condition()
+
+    def chunk_size(self):
+        if self.per_frame is None:
+            return self.probe
+        size = math.ceil(self.overhead / (OVERHEAD_SHARE * max(self.per_frame, 1e-3)))
+        share = math.ceil(len(self.pending) / self.workers)
+        size = max(1, min(size, share))
+        return min(size, self.max_chunk) if self.max_chunk else size
+
+    def next_chunk(self):
+        # Ждёт, пока появятся кадры или закончатся все куски в работе:
+        # упавший кусок возвращает кадры в очередь
+        with self._cond:
+            while not self.pending and self.in_flight:
+                self._cond.wait()
+            if not self.pending:
+                return None
+            size = self.chunk_size()
+            chunk, self.pending = self.pending[:size], self.pending[size:]
+            self.in_flight += 1
+            return chunk
+
+    def finish(self, chunk, frame_times, wall):
+        with self._cond:
+            self.in_flight -= 1
+            done = [f for f in chunk if f in frame_times]
+            if done:
+                rendered = sum(frame_times[f] for f in done)
+                self._samples.append((len(done), rendered, max(0.0, wall - rendered)))
+                frames    = sum(s[0] for s in self._samples)
+                self.per_frame = sum(s[1] for s in self._samples) / frames
+                self.overhead  = sum(s[2] for s in self._samples) / len(self._samples)
+            for f in chunk:
+                if f in frame_times:
+                    continue
+                self.attempts[f] = self.attempts.get(f, 0) + 1
+                if self.attempts[f] > self.retries:
+                    self.failed.append(f)
+                else:
+                    self.pending.append(f)
+            self.pending.sort()
+            self._cond.notify_all()
+
+
+# ---------------------------
+# Драйвер
+# ---------------------------
+def frame_path(frames_dir, frame):
+    matches = glob.glob(os.path.join(frames_dir, f"{FRAME_PREFIX}{frame:05d}.*"))
+    return matches[0] if matches else None
+
+
+def _group_ranges(frames):
+    # [1,2,3,7,8] -> "1-3,7-8": аргумент воркера остаётся коротким
+    ranges, start = [], None
+    for prev, f in zip([None] + frames, frames):
+        if prev is None or f != prev + 1:
+            if start is not None:
+                ranges.append((start, prev))
+            start = f
+    if start is not None:
+        ranges.append((start, frames[-1]))
+    return ",".join(f"{a}-{b}" for a, b in ranges)
+
+
+def _parse_ranges(text):
+    frames = []
+    for part in text.split(","):
+        a, _, b = part.partition("-")
+        frames.extend(range(int(a), int(b or a) + 1))
+    return frames
+
+
+def scene_info(blender, blend):
+    with tempfile.TemporaryDirectory() as tmp:
+        info_path = os.path.join(tmp, "info.json")
+        subprocess.run([blender, "-b", blend, "--python-exit-code", "1",
+                        "--python", os.path.abspath(__file__), "--", "--info", info_path],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, check=True)
+        with open(info_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+
+def render_chunk(blender, blend, chunk, frames_dir, log_dir):
+    name = f"chunk_{chunk[0]:05d}_{chunk[-1]:05d}"
+    timings_path = os.path.join(log_dir, name + ".json")
+    cmd = [blender, "-b", blend, "--python-exit-code", "1", "--python", os.path.abspath(__file__),
+           "--", "--worker", _group_ranges(chunk), frames_dir, timings_path]
+    start = time.perf_counter()
+    with open(os.path.join(log_dir, name + ".log"), "w", encoding="utf-8") as log:
+        subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - start
+    try:
+        with open(timings_path, "r", encoding="utf-8") as f:
+            timings = {int(k): v for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        timings = {}
+    # Кадр засчитан, только если файл действительно появился
+    return {f: t for f, t in timings.items() if frame_path(frames_dir, f)}, wall
+
+
+def assemble_video(frames_dir, first, fps, video_path):
+    ffmpeg = shutil.which("ffmpeg")
+    sample = frame_path(frames_dir, first)
+    if ffmpeg is None or sample is None:
+        return False
+    ext = os.path.splitext(sample)[1]
+    subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-framerate", f"{fps:g}",
+                    "-start_number", str(first),
+                    "-i", os.path.join(frames_dir, f"{FRAME_PREFIX}%05d{ext}"),
+                    "-c:v", "libx264", "-pix_fmt", "yuv420p", video_path], check=True)
+    return True
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Параллельный рендер сцены кусками кадров")
+    parser.add_argument("blend", help="сцена .blend")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"))
+    parser.add_argument("--out", default="renders", help="каталог кадров")
+    parser.add_argument("--workers", type=int, default=None, help="процессов Blender (по умолчанию — по числу ядер)")
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--end", type=int, default=None)
+    parser.add_argument("--probe", type=int, default=2, help="кадров в первых, замерочных кусках")
+    parser.add_argument("--max-chunk", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=2, help="повторов для упавших кадров")
+    parser.add_argument("--video", default=None, help="собрать видео (нужен ffmpeg)")
+    args = parser.parse_args(argv)
+
+    blend = os.path.abspath(args.blend)
+    info = scene_info(args.blender, blend)
+    first = info["frame_start"] if args.start is None else args.start
+    last  = info["frame_end"] if args.end is None else args.end
+    frames_dir = os.path.abspath(args.out)
+    log_dir = os.path.join(frames_dir, "logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    todo = [f for f in range(first, last + 1) if not frame_path(frames_dir, f)]
+    workers = args.workers or os.cpu_count() or 1
+    print(f"Кадры {first}–{last}: к рендеру {len(todo)}, процессов {workers}", flush=True)
+    sched = ChunkScheduler(todo, workers, probe=args.probe, max_chunk=args.max_chunk, retries=args.retries)
+
+    def run_worker():
+        while True:
+            chunk = sched.next_chunk()
+            if chunk is None:
+                return
+            times, wall = {}, 0.0
+            launched = time.perf_counter()
+            try:
+                times, wall = render_chunk(args.blender, blend, chunk, frames_dir, log_dir)
+            except Exception as e:
+                # Без finish() in_flight не обнулится и остальные потоки зависнут в next_chunk
+                wall = time.perf_counter() - launched
+                print(f"  кадры {chunk[0]}–{chunk[-1]}: ошибка запуска — {e}", flush=True)
+                continue
+            finally:
+                sched.finish(chunk, times, wall)
+            print(f"  кадры {chunk[0]}–{chunk[-1]}: {len(times)}/{len(chunk)} за {wall:.1f} с "
+                  f"(кадр ≈ {sched.per_frame or 0:.2f} с, запуск ≈ {sched.overhead or 0:.1f} с, "
+                  f"следующий кусок {sched.chunk_size()})", flush=True)
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(run_worker) for _ in range(workers)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    if sched.failed:
+        print(f"Не удалось отрендерить кадры: {_group_ranges(sorted(sched.failed))}", flush=True)
+        return 1
+    print(f"Готово за {elapsed:.1f} с: {frames_dir}")
+    if args.video:
+        if assemble_video(frames_dir, first, info["fps"], os.path.abspath(args.video)):
+            print(f"Видео: {args.video}")
+        else:
+            print("ffmpeg не найден — оставлена секвенция кадров")
+    return 0
+
+
+# ---------------------------
+# Воркер (внутри Blender)
+# ---------------------------
+def write_info(path):
+    import bpy
+
+    scene = bpy.context.scene
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"frame_start": scene.frame_start, "frame_end": scene.frame_end,
+                   "fps": scene.render.fps / scene.render.fps_base}, f)
+
+
+def render_frames(frames, frames_dir, timings_path):
+    import bpy
+
+    scene = bpy.context.scene
+    if scene.render.is_movie_format:
+        # Кусок пишет отдельные кадры, видео собирает драйвер
+        scene.render.image_settings.file_format = 'PNG'
+    scene.render.use_file_extension = True
+    scene.render.filepath = os.path.join(frames_dir, FRAME_PREFIX + "#####")
+    timings = {}
+    for frame in frames:
+        scene.frame_set(frame)
+        start = time.perf_counter()
+        bpy.ops.render.render(write_still=True)
+        timings[frame] = time.perf_counter() - start
+        # Пишем после каждого кадра: при падении драйвер перезапустит только остаток
+        with open(timings_path, "w", encoding="utf-8") as f:
+            json.dump(timings, f)
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+    if argv[:1] == ["--worker"]:
+        render_frames(_parse_ranges(argv[1]), argv[2], argv[3])
+    elif argv[:1] == ["--info"]:
+        write_info(argv[1])
+    else:
+        sys.exit(main(argv))
@@ -0,0 +1,67 @@
+# Сравнение покадрового keyframe_insert и пакетной записи F-кривых.
+#
+# Запуск:
+#   blender -b --factory-startup --python benchmarks/bench_fcurves.py
+import os
+import sys
+import time
+
+import bpy
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import newDome  # noqa: E402
+
+FRAME_COUNTS = (250, 2500, 25000)
+
+
+def make_samples(n):
+    t = np.arange(n) / n
+    angle = 2 * np.pi * t
+    return np.stack((np.cos(angle) * 10, np.sin(angle) * 10, np.sin(2 * angle)), axis=1)
+
+
+def new_empty(name):
+    obj = bpy.data.objects.new(name, None)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+
+def remove(obj):
+    action = obj.animation_data.action if obj.animation_data else None
+    bpy.data.objects.remove(obj, do_unlink=True)
+    if action is not None:
+        bpy.data.actions.remove(action)
+
+
+def bench_keyframe_insert(samples):
+    obj = new_empty("bench_insert")
+    start = time.perf_counter()
+    for f, loc in enumerate(samples, start=1):
+        obj.location = loc
+        obj.keyframe_insert(data_path="location", frame=f)
+    elapsed = time.perf_counter() - start
+    remove(obj)
+    return elapsed
+
+
+def bench_bulk(samples):
+    obj = new_empty("bench_bulk")
+    start = time.perf_counter()
+    newDome.write_location_keys(obj, range(1, len(samples) + 1), samples)
+    elapsed = time.perf_counter() - start
+    remove(obj)
+    return elapsed
+
+
+def main():
+    print(f"{'кадров':>8} {'keyframe_insert, с':>20} {'foreach_set, с':>16} {'ускорение':>10}")
+    for n in FRAME_COUNTS:
+        samples = make_samples(n)
+        slow = bench_keyframe_insert(samples.tolist())
+        fast = bench_bulk(samples)
+        print(f"{n:>8} {slow:>20.4f} {fast:>16.4f} {slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
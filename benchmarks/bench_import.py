@@ -0,0 +1,67 @@
+# Сравнение режимов сборки импортированной модели: bpy.ops.object.join,
+# слияние через data API и иерархия без слияния, на синтетическом glTF из многих частей.
+#
+# Запуск:
+#   blender -b --factory-startup --python benchmarks/bench_import.py
+import os
+import sys
+import tempfile
+import time
+
+import bmesh
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import newDome  # noqa: E402
+
+PART_COUNTS = (50, 500, 2000)
+MODES = ('JOIN', 'MERGE', 'HIERARCHY')
+
+
+def reset():
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    newDome.clear_bounds_cache()
+
+
+def make_parts_gltf(path, count):
+    # Отдельный меш на каждую часть, два материала и UV — как у типичной модели со Sketchfab
+    reset()
+    materials = [bpy.data.materials.new(f"bench_mat_{i}") for i in range(2)]
+    side = max(1, round(count ** (1 / 3)))
+    for i in range(count):
+        mesh = bpy.data.meshes.new(f"bench_part_{i}")
+        bm = bmesh.new()
+        bmesh.ops.create_icosphere(bm, subdivisions=2, radius=0.4, calc_uvs=True)
+        bm.to_mesh(mesh)
+        bm.free()
+        mesh.materials.append(materials[i % 2])
+        obj = bpy.data.objects.new(mesh.name, mesh)
+        obj.location = (i % side, (i // side) % side, i // (side * side))
+        bpy.context.scene.collection.objects.link(obj)
+    bpy.ops.export_scene.gltf(filepath=path, export_format='GLB')
+
+
+def bench_mode(path, mode):
+    reset()
+    start = time.perf_counter()
+    root = newDome.import_model_geometry(path, mode=mode)
+    imported = time.perf_counter()
+    bpy.context.view_layer.update()
+    newDome.model_bounds(root)
+    bounded = time.perf_counter()
+    return imported - start, bounded - imported
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    print(f"{'частей':>7} {'режим':>10} {'импорт, с':>10} {'габариты, с':>12}")
+    for count in PART_COUNTS:
+        path = os.path.join(tmp_dir, f"parts_{count}.glb")
+        make_parts_gltf(path, count)
+        for mode in MODES:
+            load, bounds = bench_mode(path, mode)
+            print(f"{count:>7} {mode:>10} {load:>10.3f} {bounds:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+# Набор бенчмарков горячих путей аддонов в фоновом Blender: габариты, загрузка
+# (и поиск в локальной библиотеке), импорт, свет, облёты камеры, купол и экспорт на телефон.
+#
+# Запуск:
+#   blender -b --factory-startup --python benchmarks/bench_suite.py -- \
+#       --out bench.json --baseline benchmarks/baseline.json
+#   ... -- --quick                 только небольшие размеры
+#   ... -- --only bounds,camera    выбранные группы
+#   ... -- --update-baseline       записать прогон как новый базовый
+#
+# Модели синтетические: сетки от 10k до 5M вершин и glTF из многих частей.
+# Они упаковываются в zip, как архивы Sketchfab, и раздаются sketchfab_stub.py,
+# поэтому загрузка идёт тем же путём, что и с настоящего Sketchfab, но без сети.
+# Кэш аддонов (AR_CACHE_DIR) и порт предпросмотра уводятся во временный каталог.
+# Результат — JSON с медианой и минимумом по каждому замеру; сравнение с базовым
+# прогоном — compare.py (его же можно запустить отдельно, без Blender).
+import argparse
+import importlib
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+import bpy
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR  = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+import compare  # noqa: E402
+from sketchfab_stub import SketchfabStub  # noqa: E402
+
+VERTEX_COUNTS       = (10_000, 100_000, 1_000_000, 5_000_000)
+QUICK_VERTEX_COUNTS = (10_000, 100_000)
+PART_COUNTS         = (50, 500, 2000)
+QUICK_PART_COUNTS   = (50, 500)
+IMPORT_VERTEX_LIMIT = 1_000_000  # сетки крупнее идут только в замеры габаритов
+GROUPS   = ("bounds", "download", "import", "lighting", "camera", "dome", "export")
+FRAMES   = 250
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Аддоны импортируются в main(), после того как окружение указывает на подмену Sketchfab
+newDome = None
+new     = None
+
+
+# ---------------------------
+# Замеры
+# ---------------------------
+def reset():
+    bpy.data.batch_remove(list(bpy.data.objects))
+    bpy.data.orphans_purge(do_recursive=True)
+    newDome.clear_bounds_cache()
+    new.clear_bounds_cache()
+
+
+def remove_new_objects(before):
+    bpy.data.batch_remove([o for o in bpy.data.objects if o.session_uid not in before])
+    bpy.data.orphans_purge(do_recursive=True)
+
+
+class Suite:
+    def __init__(self, repeat=3, groups=GROUPS):
+        self.repeat  = repeat
+        self.groups  = set(groups)
+        self.results = {}
+
+    def wants(self, *groups):
+        return bool(self.groups.intersection(groups))
+
+    def run(self, name, fn, params=None, setup=None, repeat=None):
+        # Объекты, созданные замером, удаляются после каждого повтора,
+        # так что каждый повтор начинается с одинаковой сцены
+        if not self.wants(name.split("/")[0]):
+            return
+        key = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+        times = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            before = {o.session_uid for o in bpy.data.objects}
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+            remove_new_objects(before)
+        self.results[key] = {
+            "name": name,
+            "params": params or {},
+            "times": [round(t, 6) for t in times],
+            "min": min(times),
+            "median": statistics.median(times),
+        }
+        print(f"  {key:<64} {self.results[key]['median']:>10.4f} с", flush=True)
+
+
+# ---------------------------
+# Синтетические модели
+# ---------------------------
+def make_grid_mesh(name, vertices):
+    # Волнистая сетка side × side через foreach_set: 5M вершин строятся за секунды
+    side = max(2, math.isqrt(vertices))
+    x, y = np.meshgrid(np.linspace(-1.0, 1.0, side), np.linspace(-1.0, 1.0, side))
+    z = 0.1 * np.sin(x * 8.0) * np.cos(y * 8.0)
+    co = np.stack((x, y, z), axis=-1).reshape(-1, 3).astype(np.float32)
+    idx = np.arange(side * side, dtype=np.int32).reshape(side, side)
+    quads = np.stack((idx[:-1, :-1], idx[:-1, 1:], idx[1:, 1:], idx[1:, :-1]), axis=-1).reshape(-1, 4)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set("vertex_index", quads.ravel())
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+    mesh.update()
+    return mesh
+
+
+def make_grid_object(vertices):
+    obj = newDome.link_new_object(f"bench_grid_{vertices}", make_grid_mesh(f"bench_grid_{vertices}", vertices),
+                                  rotation=(0.3, 0.5, 0.1))
+    bpy.context.view_layer.update()
+    return obj
+
+
+def make_parts(count):
+    # Отдельный меш на каждую часть и два материала — как у типичной модели со Sketchfab
+    materials = [bpy.data.materials.new(f"bench_mat_{i}") for i in range(2)]
+    side = max(1, round(count ** (1 / 3)))
+    for i in range(count):
+        mesh = make_grid_mesh(f"bench_part_{i}", 400)
+        mesh.materials.append(materials[i % 2])
+        newDome.link_new_object(mesh.name, mesh, location=(i % side, (i // side) % side, i // (side * side)))
+
+
+def export_fixture(out_dir, uid):
+    # Сцена → .gltf + .bin, как в архивах Sketchfab, → zip
+    gltf_dir = os.path.join(out_dir, uid)
+    os.makedirs(gltf_dir, exist_ok=True)
+    bpy.ops.export_scene.gltf(filepath=os.path.join(gltf_dir, "scene.gltf"), export_format='GLTF_SEPARATE')
+    zip_path = os.path.join(out_dir, f"{uid}.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+        for name in sorted(os.listdir(gltf_dir)):
+            z.write(os.path.join(gltf_dir, name), name)
+    shutil.rmtree(gltf_dir)
+    return zip_path
+
+
+def build_fixtures(out_dir, vertex_counts, part_counts):
+    models = {}
+    for count in part_counts:
+        reset()
+        make_parts(count)
+        models[f"parts_{count}"] = {"zip": export_fixture(out_dir, f"parts_{count}"),
+                                    "name": f"parts {count}", "tags": ["bench", "parts"]}
+    for vertices in vertex_counts:
+        if vertices > IMPORT_VERTEX_LIMIT:
+            continue
+        reset()
+        make_grid_object(vertices)
+        models[f"grid_{vertices}"] = {"zip": export_fixture(out_dir, f"grid_{vertices}"),
+                                      "name": f"grid {vertices}", "tags": ["bench", "grid"]}
+    reset()
+    return models
+
+
+def make_plane():
+    # Фон как у create_video_plane, но без видеофайла
+    plane = newDome.link_new_object("AR_Background", newDome.plane_mesh("AR_Background"), rotation=(1.5708, 0, 0))
+    plane.scale = (17.5, 10.0, 1.0)
+    bpy.context.view_layer.update()
+    return plane
+
+
+# ---------------------------
+# Группы замеров
+# ---------------------------
+def bench_bounds(suite, vertex_counts):
+    for vertices in vertex_counts:
+        reset()
+        obj = make_grid_object(vertices)
+        params = {"vertices": vertices}
+        cold = lambda: (newDome.clear_bounds_cache(), new.clear_bounds_cache())
+        suite.run("bounds/precise_bounds", lambda: newDome.precise_bounds(obj), params, setup=cold)
+        suite.run("bounds/mesh_world_bounds", lambda: new.mesh_world_bounds(obj, precise=True), params, setup=cold)
+        suite.run("bounds/mesh_world_bounds.fast", lambda: new.mesh_world_bounds(obj, precise=False), params,
+                  setup=cold)
+        suite.run("bounds/mesh_world_bounds.cached", lambda: new.mesh_world_bounds(obj, precise=True), params)
+    reset()
+
+
+def bench_download(suite, uid):
+    def cold():
+        newDome.close_sketchfab_client()
+        newDome.close_model_library()
+        shutil.rmtree(newDome.AR_CACHE_DIR, ignore_errors=True)
+
+    fetch = lambda: newDome.download_model_from_sketchfab(uid)
+    suite.run("download/cold", fetch, {"model": uid}, setup=cold)
+    suite.run("download/cached", fetch, {"model": uid})
+    # Скачанная модель уже в локальной библиотеке: запрос решается без сети
+    suite.run("download/library", lambda: newDome.resolve_model(uid, mode='OFFLINE'), {"model": uid})
+
+
+def bench_model(suite, uid, export_dir):
+    path  = newDome.download_model_from_sketchfab(uid)
+    scene = bpy.context.scene
+    scene.frame_start, scene.frame_end = 1, FRAMES
+    holder = {}
+
+    def fresh_plane():
+        reset()
+        holder["plane"] = make_plane()
+
+    for mode, _, _ in newDome.IMPORT_MODES:
+        suite.run("import/import_model", lambda: newDome.import_model(path, holder["plane"], mode=mode),
+                  {"model": uid, "mode": mode}, setup=fresh_plane)
+
+    fresh_plane()
+    plane = holder["plane"]
+    root  = newDome.import_model(path, plane)
+    params = {"model": uid}
+
+    suite.run("lighting/setup_lighting", lambda: newDome.setup_lighting(root), params)
+    for flicker in ('PROCEDURAL', 'BAKED', 'OFF'):
+        suite.run("lighting/setup_lighting.new", lambda: new.setup_lighting(root, flicker=flicker),
+                  dict(params, flicker=flicker))
+
+    for anim_type in newDome.CAMERA_PATHS:
+        for constant_speed in (False, True):
+            for tolerance in (None, 0.001):
+                suite.run("camera/apply_camera_animation",
+                          lambda: newDome.apply_camera_animation(root, anim_type=anim_type, frames=FRAMES,
+                                                                 constant_speed=constant_speed,
+                                                                 tolerance=tolerance),
+                          dict(params, type=anim_type, constant_speed=constant_speed,
+                               sparse=tolerance is not None))
+
+    for resolution in new.DOME_RESOLUTIONS:
+        def drop_dome_mesh():
+            mesh = bpy.data.meshes.get(f"AR_Fog_Dome_Mesh_{resolution}")
+            if mesh is not None:
+                bpy.data.meshes.remove(mesh)
+        suite.run("dome/add_foggy_dome", lambda: new.add_foggy_dome(root, plane, resolution=resolution),
+                  dict(params, resolution=resolution), setup=drop_dome_mesh)
+
+    serve = lambda: newDome.export_and_serve_ar(root, scene, export_dir)
+    suite.run("export/export_and_serve_ar", serve, params,
+              setup=lambda: shutil.rmtree(export_dir, ignore_errors=True))
+    suite.run("export/export_and_serve_ar.cached", serve, params)
+    newDome.shutdown_preview_server()
+
+
+# ---------------------------
+# Запуск
+# ---------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv):
+    global newDome, new
+    parser = argparse.ArgumentParser(description="Бенчмарки аддонов в фоновом Blender")
+    parser.add_argument("--out", default="bench_results.json", help="куда записать JSON с результатами")
+    parser.add_argument("--baseline", default=BASELINE, help="базовый прогон для сравнения")
+    parser.add_argument("--update-baseline", action="store_true", help="записать прогон как базовый")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="только небольшие размеры")
+    parser.add_argument("--only", default=",".join(GROUPS), help="группы через запятую: " + ", ".join(GROUPS))
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответов подмены Sketchfab")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="скорость CDN подмены, Мбит/с (0 — без ограничений)")
+    args = parser.parse_args(argv)
+
+    vertex_counts = QUICK_VERTEX_COUNTS if args.quick else VERTEX_COUNTS
+    part_counts   = QUICK_PART_COUNTS if args.quick else PART_COUNTS
+    suite = Suite(args.repeat, [g.strip() for g in args.only.split(",") if g.strip()])
+
+    tmp_dir = tempfile.mkdtemp(prefix="ar_bench_")
+    stub = None
+    try:
+        # Окружение задаётся до импорта аддонов: они читают его при загрузке модуля
+        os.environ["AR_CACHE_DIR"]    = os.path.join(tmp_dir, "cache")
+        os.environ["AR_PREVIEW_PORT"] = str(free_port())
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+        stub = SketchfabStub({}, latency=args.latency_ms / 1000.0, bandwidth=args.bandwidth_mbps * 125_000)
+        os.environ["AR_SKETCHFAB_API_URL"] = stub.api_url
+        newDome = importlib.import_module("newDome")
+        new     = importlib.import_module("new")
+        newDome.register()
+
+        started = time.perf_counter()
+        if suite.wants("bounds"):
+            print("Габариты", flush=True)
+            bench_bounds(suite, vertex_counts)
+        if suite.wants("download", "import", "lighting", "camera", "dome", "export"):
+            print("Синтетические модели", flush=True)
+            stub.models.update({uid: dict(m, uid=uid) for uid, m in
+                                build_fixtures(os.path.join(tmp_dir, "fixtures"), vertex_counts, part_counts).items()})
+            for uid in stub.models:
+                print(f"Модель {uid}", flush=True)
+                bench_download(suite, uid)
+                bench_model(suite, uid, os.path.join(tmp_dir, "export", uid))
+        elapsed = time.perf_counter() - started
+        newDome.unregister()
+    finally:
+        if stub is not None:
+            stub.shutdown()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "blender": bpy.app.version_string,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "revision": git_revision(),
+            "repeat": args.repeat,
+            "quick": args.quick,
+            "elapsed": elapsed,
+            "stub_requests": stub.requests,
+        },
+        "results": suite.results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {os.path.abspath(args.out)}")
+
+    status = 0
+    if args.baseline and os.path.exists(args.baseline) and not args.update_baseline:
+        rows = compare.compare(report, compare.load_results(args.baseline), args.threshold)
+        compare.print_comparison(rows)
+        status = 1 if any(r["status"] == "slower" for r in rows) else 0
+    if args.update_baseline:
+        shutil.copyfile(args.out, args.baseline)
+        print(f"Базовый прогон обновлён: {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    code = main(argv)
+    if code:
+        sys.exit(code)
@@ -0,0 +1,71 @@
+# Сравнение результатов bench_suite.py с сохранённым базовым прогоном.
+#
+# Запуск (Blender не нужен):
+#   python benchmarks/compare.py results.json benchmarks/baseline.json --threshold 0.2
+import argparse
+import json
+import sys
+
+MIN_DELTA = 0.001  # секунды: разница меньше — шум таймера, а не регрессия
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(current, baseline, threshold=0.2):
+    # Сравниваются медианы; регрессия — медленнее больше чем на threshold
+    # и больше чем на MIN_DELTA в абсолютных секундах
+    rows = []
+    cur, base = current["results"], baseline["results"]
+    for key in sorted(set(cur) | set(base)):
+        now, before = cur.get(key), base.get(key)
+        if now is None or before is None:
+            rows.append({"key": key, "status": "new" if before is None else "missing",
+                         "median": now and now["median"], "baseline": before and before["median"],
+                         "ratio": None})
+            continue
+        ratio = now["median"] / before["median"] if before["median"] > 0 else None
+        delta = now["median"] - before["median"]
+        if ratio is not None and ratio > 1 + threshold and delta > MIN_DELTA:
+            status = "slower"
+        elif ratio is not None and ratio < 1 / (1 + threshold) and -delta > MIN_DELTA:
+            status = "faster"
+        else:
+            status = "same"
+        rows.append({"key": key, "status": status, "median": now["median"],
+                     "baseline": before["median"], "ratio": ratio})
+    return rows
+
+
+def print_comparison(rows, verbose=False):
+    width = max((len(r["key"]) for r in rows), default=10)
+    print(f"{'бенчмарк':<{width}} {'было, с':>10} {'стало, с':>10} {'×':>7}  статус")
+    for r in rows:
+        if not verbose and r["status"] == "same":
+            continue
+        before = f"{r['baseline']:.4f}" if r["baseline"] is not None else "—"
+        now    = f"{r['median']:.4f}" if r["median"] is not None else "—"
+        ratio  = f"{r['ratio']:.2f}" if r["ratio"] is not None else "—"
+        print(f"{r['key']:<{width}} {before:>10} {now:>10} {ratio:>7}  {r['status']}")
+    counts = {}
+    for r in rows:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    print(", ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Сравнение прогона бенчмарков с базовым")
+    parser.add_argument("results")
+    parser.add_argument("baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    parser.add_argument("--verbose", action="store_true", help="показывать и неизменившиеся")
+    args = parser.parse_args(argv)
+    rows = compare(load_results(args.results), load_results(args.baseline), args.threshold)
+    print_comparison(rows, args.verbose)
+    return 1 if any(r["status"] == "slower" for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
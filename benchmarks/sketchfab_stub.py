@@ -0,0 +1,157 @@
+# Локальная подмена Sketchfab для бенчмарков: те же эндпоинты, что вызывает
+# download_model_from_sketchfab (поиск, ссылка на скачивание, CDN с архивом),
+# но модели берутся из заданных zip-файлов. Аддоны переключаются на неё через
+# переменную окружения AR_SKETCHFAB_API_URL=<api_url> до импорта. Её же
+# используют тесты клиента (tests/): fail() подсовывает ответы 5xx/429.
+#
+# Отдельно (без Blender), для ручной проверки:
+#   python benchmarks/sketchfab_stub.py robot=/path/robot.zip chair=/path/chair.zip
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server.stub
+        if stub.latency:
+            time.sleep(stub.latency)
+        url   = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+
+        endpoint = self._endpoint(parts)
+        if endpoint is not None:
+            stub.count(endpoint)
+            status = stub.next_failure(endpoint)
+            if status is not None:
+                self._send_json({"detail": "Injected failure"}, status=status)
+                return
+
+        if endpoint == "search":
+            query = parse_qs(url.query).get("q", [""])[0].lower()
+            self._send_json({"results": stub.search(query)})
+        elif endpoint == "download":
+            if parts[2] not in stub.models:
+                self._send_json({"detail": "Not found"}, status=404)
+                return
+            host = self.headers.get("Host", f"127.0.0.1:{self.server.server_port}")
+            self._send_json({"gltf": {"url": f"http://{host}/cdn/{parts[2]}.zip", "expires": 300}})
+        elif endpoint == "cdn":
+            model = stub.models.get(parts[1][:-4])
+            if model is None:
+                self._send_json({"detail": "Not found"}, status=404)
+                return
+            self._send_file(model["zip"], stub.bandwidth)
+        else:
+            self._send_json({"detail": "Not found"}, status=404)
+
+    @staticmethod
+    def _endpoint(parts):
+        if parts == ["v3", "search"]:
+            return "search"
+        if len(parts) == 4 and parts[:2] == ["v3", "models"] and parts[3] == "download":
+            return "download"
+        if len(parts) == 2 and parts[0] == "cdn" and parts[1].endswith(".zip"):
+            return "cdn"
+        return None
+
+    def _send_file(self, path, bandwidth):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        chunk = 1 << 16
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(chunk)
+                if not data:
+                    break
+                self.wfile.write(data)
+                if bandwidth:
+                    time.sleep(len(data) / bandwidth)
+
+
+class SketchfabStub:
+    # models: uid -> {"zip": путь к архиву, "name", "tags", "faceCount"}.
+    # latency — задержка каждого ответа в секундах, bandwidth — байт/с для CDN
+    # (0 — без ограничений): так можно прогнать и «медленную сеть».
+    def __init__(self, models, host="127.0.0.1", port=0, latency=0.0, bandwidth=0):
+        self.models    = {uid: dict(m, uid=uid) for uid, m in models.items()}
+        self.latency   = latency
+        self.bandwidth = bandwidth
+        self.requests  = {}
+        self.failures  = {}   # эндпоинт -> HTTP-статусы, которые он вернёт до нормального ответа
+        self._lock     = threading.Lock()
+        self.httpd = http.server.ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def api_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v3"
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def fail(self, endpoint, *statuses):
+        # Следующие ответы эндпоинта — ошибки с этими статусами (проверка повторов)
+        with self._lock:
+            self.failures.setdefault(endpoint, []).extend(statuses)
+
+    def next_failure(self, endpoint):
+        with self._lock:
+            queue = self.failures.get(endpoint)
+            return queue.pop(0) if queue else None
+
+    def search(self, query):
+        # Совпадение всех слов запроса с uid, именем или тегами; точное совпадение — первым
+        words = query.split()
+        found = []
+        for model in self.models.values():
+            text = " ".join([model["uid"], model.get("name", "")] + model.get("tags", [])).lower()
+            if all(w in text for w in words):
+                found.append(model)
+        found.sort(key=lambda m: (query not in (m["uid"].lower(), m.get("name", "").lower()), m["uid"]))
+        return [{"uid": m["uid"], "name": m.get("name", m["uid"]),
+                 "tags": [{"name": t} for t in m.get("tags", [])],
+                 "faceCount": m.get("faceCount")} for m in found]
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join(timeout=2.0)
+
+
+if __name__ == "__main__":
+    models = {}
+    for arg in sys.argv[1:]:
+        uid, _, path = arg.partition("=")
+        models[uid] = {"zip": os.path.abspath(path), "name": uid}
+    stub = SketchfabStub(models, port=int(os.environ.get("STUB_PORT", "0")))
+    print(f"AR_SKETCHFAB_API_URL={stub.api_url}", flush=True)
+    try:
+        stub.thread.join()
+    except KeyboardInterrupt:
+        stub.shutdown()
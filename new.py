@@ -9,11 +9,28 @@ bl_info = {
 }
 
 import bpy
+import bmesh
 import os
 import math
 import tempfile
 import zipfile
+import posixpath
+import struct
+import shutil
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import sys
+import concurrent.futures
+import contextlib
+import threading
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import unquote
 from mathutils import Vector
 
 # ---------------------------
@@ -21,6 +38,17 @@ from mathutils import Vector
 # ---------------------------
 SKETCHFAB_TOKEN = ""
 
+SKETCHFAB_API_URL = os.environ.get("AR_SKETCHFAB_API_URL", "https://api.sketchfab.com/v3")
+
+AR_CACHE_DIR = os.environ.get(
+    "AR_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "ar_scene_builder"),
+)
+MODEL_CACHE_DIR      = os.path.join(AR_CACHE_DIR, "models")
+TEXTURE_CACHE_DIR    = os.path.join(AR_CACHE_DIR, "textures")
+MODEL_CACHE_LIMIT_MB = 2048
+SEARCH_CACHE_TTL     = 24 * 3600  # секунды
+
 # ---------------------------
 # Свойства сцены
 # ---------------------------
@@ -40,106 +68,1312 @@ def register_props():
         description="Введите запрос для поиска модели на Sketchfab",
         default="robot"
     )
+    bpy.types.Scene.ar_library_mode = bpy.props.EnumProperty(
+        name="Источник моделей",
+        items=LIBRARY_MODES,
+        default='LOCAL_FIRST'
+    )
+    bpy.types.Scene.ar_library_dirs = bpy.props.StringProperty(
+        name="Каталоги библиотеки",
+        description="Каталоги с .glb/.gltf для локального поиска, через «;»",
+        default=""
+    )
     bpy.types.Scene.ar_model_rot = bpy.props.FloatVectorProperty(
         name="Доп. поворот (°)",
         subtype='EULER',
         default=(0.0, 0.0, 0.0)
     )
+    bpy.types.Scene.ar_light_flicker = bpy.props.EnumProperty(
+        name="Мерцание света",
+        items=[
+            ('PROCEDURAL', "Процедурное", "Драйвер вычисляет яркость на каждом кадре, ключи не создаются"),
+            ('BAKED',      "Запечённое",  "Ключ яркости на каждом кадре (как раньше)"),
+            ('OFF',        "Выключено",   "Постоянная яркость"),
+        ],
+        default='PROCEDURAL'
+    )
+    bpy.types.Scene.ar_light_flicker_amp = bpy.props.FloatProperty(
+        name="Амплитуда мерцания",
+        default=1.2,
+        min=0.0
+    )
+    bpy.types.Scene.ar_light_flicker_freq = bpy.props.FloatProperty(
+        name="Частота мерцания",
+        default=2.5,
+        min=0.0
+    )
+    bpy.types.Scene.ar_camera_sparse_keys = bpy.props.BoolProperty(
+        name="Разреженные ключи камеры",
+        description="Подбирать Bezier-ключи с заданной точностью вместо ключа на каждом кадре",
+        default=False
+    )
+    bpy.types.Scene.ar_camera_key_tolerance = bpy.props.FloatProperty(
+        name="Допуск",
+        subtype='DISTANCE',
+        description="Максимальное отклонение кривой от рассчитанной траектории",
+        default=0.01,
+        min=0.0001,
+        soft_max=1.0
+    )
+    bpy.types.Scene.ar_dome_resolution = bpy.props.EnumProperty(
+        name="Разрешение купола",
+        items=[
+            ('LOW',    "Низкое",  "32×16 сегментов"),
+            ('MEDIUM', "Среднее", "64×32 сегмента"),
+            ('HIGH',   "Высокое", "128×64 сегмента"),
+        ],
+        default='MEDIUM'
+    )
+    bpy.types.Scene.ar_import_mode = bpy.props.EnumProperty(
+        name="Импорт",
+        description="Как собирать части импортированной модели",
+        items=IMPORT_MODES,
+        default='MERGE'
+    )
+    bpy.types.Scene.ar_lod_enabled = bpy.props.BoolProperty(
+        name="LOD",
+        description="Прореживать модель до бюджета треугольников (модификатор AR_LOD)",
+        default=False,
+        update=_lod_toggled
+    )
+    bpy.types.Scene.ar_lod_budget = bpy.props.IntProperty(
+        name="Бюджет треугольников",
+        description="Сколько треугольников оставить после прореживания",
+        default=100000,
+        min=1000,
+        soft_max=2000000
+    )
+    bpy.types.Scene.ar_texture_max_size = bpy.props.IntProperty(
+        name="Макс. размер текстур",
+        description="Большая сторона картинок модели в пикселях (0 — без ограничения)",
+        default=2048,
+        min=0,
+        soft_max=8192
+    )
+    bpy.types.Scene.ar_texture_format = bpy.props.EnumProperty(
+        name="Формат текстур",
+        items=TEXTURE_FORMATS,
+        default='KEEP'
+    )
+    bpy.types.Scene.ar_texture_quality = bpy.props.IntProperty(
+        name="Качество",
+        description="Качество сжатия JPEG/WebP при перекодировании текстур",
+        default=90,
+        min=10,
+        max=100,
+        subtype='PERCENTAGE'
+    )
+    bpy.types.Scene.ar_cache_limit_mb = bpy.props.IntProperty(
+        name="Кэш моделей (МБ)",
+        description="Максимальный размер кэша скачанных моделей на диске",
+        default=MODEL_CACHE_LIMIT_MB,
+        min=0
+    )
+    bpy.types.Scene.ar_show_profile = bpy.props.BoolProperty(
+        name="Профиль сборки",
+        description="Показать время, память и счётчики по стадиям последней сборки",
+        default=False
+    )
 
 def unregister_props():
     del bpy.types.Scene.ar_video_path
     del bpy.types.Scene.ar_hdri_path
     del bpy.types.Scene.ar_prompt
+    del bpy.types.Scene.ar_library_mode
+    del bpy.types.Scene.ar_library_dirs
     del bpy.types.Scene.ar_model_rot
+    del bpy.types.Scene.ar_cache_limit_mb
+    del bpy.types.Scene.ar_import_mode
+    del bpy.types.Scene.ar_lod_enabled
+    del bpy.types.Scene.ar_lod_budget
+    del bpy.types.Scene.ar_texture_max_size
+    del bpy.types.Scene.ar_texture_format
+    del bpy.types.Scene.ar_texture_quality
+    del bpy.types.Scene.ar_dome_resolution
+    del bpy.types.Scene.ar_camera_sparse_keys
+    del bpy.types.Scene.ar_camera_key_tolerance
+    del bpy.types.Scene.ar_light_flicker
+    del bpy.types.Scene.ar_light_flicker_amp
+    del bpy.types.Scene.ar_light_flicker_freq
+    del bpy.types.Scene.ar_show_profile
 
 # ---------------------------
 # Очистка сцены
 # ---------------------------
 def clear_scene():
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    bpy.data.batch_remove(list(bpy.context.scene.objects))
     for data_group in (bpy.data.materials, bpy.data.images, bpy.data.textures):
         for item in list(data_group):
+            if is_template(item):
+                continue
             try:
                 data_group.remove(item, do_unlink=True)
-            except:
+            except Exception as e:
+                print(f"Не удалось удалить {item.name}: {e}")
+    clear_bounds_cache()
+
+def plane_mesh(name):
+    # Квадрат 1×1 с UV, как primitive_plane_add(size=1)
+    mesh=bpy.data.meshes.new(name)
+    mesh.from_pydata([(-0.5,-0.5,0),(0.5,-0.5,0),(0.5,0.5,0),(-0.5,0.5,0)], [], [(0,1,2,3)])
+    mesh.uv_layers.new(name="UVMap").data.foreach_set("uv", (0,0, 1,0, 1,1, 0,1))
+    return mesh
+
+def link_new_object(name, data=None, location=(0,0,0), rotation=(0,0,0)):
+    # Объект через data API: без операторов, выделения и active_object,
+    # поэтому сборка работает и в blender -b без окна
+    obj=bpy.data.objects.new(name, data)
+    obj.location=location
+    obj.rotation_euler=rotation
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+# ---------------------------
+# Шаблоны материалов
+# ---------------------------
+# Деревья узлов строятся один раз в скрытый шаблон (AR_TPL_*, fake user) или
+# берутся из ar_templates.blend рядом с аддоном; сборка лишь копирует шаблон
+# (или переиспользует готовую копию) и перепривязывает картинки.
+TEMPLATE_PREFIX  = "AR_TPL_"
+TEMPLATE_LIBRARY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ar_templates.blend")
+NODE_TEMPLATES   = {}  # (kind, name) -> builder(node_tree)
+
+def register_node_template(kind, name):
+    def decorator(fn):
+        NODE_TEMPLATES[(kind, name)] = fn
+        return fn
+    return decorator
+
+def _template_datablocks(kind):
+    return bpy.data.worlds if kind == 'WORLD' else bpy.data.materials
+
+def is_template(idblock):
+    return idblock.name.startswith(TEMPLATE_PREFIX)
+
+def _append_template(kind, full_name):
+    if not os.path.isfile(TEMPLATE_LIBRARY):
+        return None
+    attr = "worlds" if kind == 'WORLD' else "materials"
+    with bpy.data.libraries.load(TEMPLATE_LIBRARY, link=False) as (data_from, data_to):
+        if full_name in getattr(data_from, attr):
+            setattr(data_to, attr, [full_name])
+    return _template_datablocks(kind).get(full_name)
+
+def get_node_template(kind, name):
+    full_name = TEMPLATE_PREFIX + name
+    datablocks = _template_datablocks(kind)
+    template = datablocks.get(full_name) or _append_template(kind, full_name)
+    if template is None:
+        template = datablocks.new(full_name)
+        template.use_nodes = True
+        NODE_TEMPLATES[(kind, name)](template.node_tree)
+    template.use_fake_user = True
+    return template
+
+def node_template_instance(kind, name, instance_name, images=None):
+    # Одна копия на имя: повторная сборка переиспользует её, не создавая .001
+    datablocks = _template_datablocks(kind)
+    instance = datablocks.get(instance_name)
+    if instance is None or instance.get("ar_template") != name:
+        instance = get_node_template(kind, name).copy()
+        instance.use_fake_user = False
+        instance.name = instance_name
+        instance["ar_template"] = name
+    for node_name, image in (images or {}).items():
+        node = instance.node_tree.nodes[node_name]
+        previous, node.image = node.image, image
+        # Прежняя картинка (например, видео до смены пути) больше никому не нужна
+        if previous is not None and previous != image and previous.users == 0:
+            bpy.data.images.remove(previous)
+    return instance
+
+@register_node_template('MATERIAL', "Video")
+def _build_video_material(tree):
+    nodes = tree.nodes
+    links = tree.links
+    nodes.clear()
+    output   = nodes.new("ShaderNodeOutputMaterial")
+    emission = nodes.new("ShaderNodeEmission")
+    tex      = nodes.new("ShaderNodeTexImage")
+    tex.name = "AR_Video"
+    tex.image_user.use_auto_refresh = True
+    tex.image_user.frame_start      = 1
+    links.new(tex.outputs["Color"],        emission.inputs["Color"])
+    links.new(emission.outputs["Emission"], output.inputs["Surface"])
+
+@register_node_template('WORLD', "HDRI")
+def _build_hdri_world(tree):
+    nodes = tree.nodes
+    links = tree.links
+    nodes.clear()
+    output   = nodes.new("ShaderNodeOutputWorld")
+    bg       = nodes.new("ShaderNodeBackground")
+    env      = nodes.new("ShaderNodeTexEnvironment")
+    env.name = "AR_HDRI"
+    links.new(env.outputs["Color"],     bg.inputs["Color"])
+    links.new(bg.outputs["Background"], output.inputs["Surface"])
+
+@register_node_template('MATERIAL', "FogDome")
+def _build_fog_dome_material(tree):
+    nodes=tree.nodes
+    links=tree.links
+    nodes.clear()
+    output=nodes.new("ShaderNodeOutputMaterial")
+    emission=nodes.new("ShaderNodeEmission")
+    gradient=nodes.new("ShaderNodeTexGradient")
+    coord=nodes.new("ShaderNodeTexCoord")
+    ramp=nodes.new("ShaderNodeValToRGB")
+    transparent=nodes.new("ShaderNodeBsdfTransparent")
+    mix=nodes.new("ShaderNodeMixShader")
+    gradient.gradient_type='SPHERICAL'
+    ramp.color_ramp.elements[0].position=0.1
+    ramp.color_ramp.elements[0].color=(0.8,0.1,1.0,1.0)
+    ramp.color_ramp.elements[1].position=1.0
+    ramp.color_ramp.elements[1].color=(0.0,0.0,0.0,0.0)
+    links.new(coord.outputs["Object"], gradient.inputs["Vector"])
+    links.new(gradient.outputs["Fac"], ramp.inputs["Fac"])
+    links.new(ramp.outputs["Color"], emission.inputs["Color"])
+    emission.inputs["Strength"].default_value=1.5
+    links.new(emission.outputs["Emission"], mix.inputs[2])
+    links.new(transparent.outputs["BSDF"], mix.inputs[1])
+    mix.inputs["Fac"].default_value=0.5
+    links.new(mix.outputs["Shader"], output.inputs["Surface"])
+
+# ---------------------------
+# Кэш моделей на диске
+# ---------------------------
+# Распакованные архивы лежат в MODEL_CACHE_DIR/<sha256 архива>/,
+# index.json связывает uid модели Sketchfab с контрольной суммой архива.
+def _cache_index_path():
+    return os.path.join(MODEL_CACHE_DIR, "index.json")
+
+def _load_cache_index():
+    try:
+        with open(_cache_index_path(), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    index.setdefault("uids", {})
+    index.setdefault("blobs", {})
+    return index
+
+def _save_cache_index(index):
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    tmp_path = _cache_index_path() + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, _cache_index_path())
+
+def _read_lock_owner(path):
+    try:
+        with open(path, "r", encoding="ascii") as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+@contextlib.contextmanager
+def file_lock(path, timeout=1200.0, stale=900.0, poll=0.2):
+    # Межпроцессная блокировка на lock-файле (O_EXCL): пакетные воркеры не качают
+    # одну модель дважды и не затирают друг другу индекс кэша. Файл, не
+    # обновлявшийся stale секунд, считается брошенным упавшим процессом; поэтому
+    # ждущий не сдаётся раньше stale, а владелец во время долгой работы вызывает
+    # выданную ему функцию refresh() (не чаще раза в stale / 10 секунд она
+    # обновляет mtime файла).
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    deadline = time.monotonic() + max(timeout, stale + poll)
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > stale:
+                    os.remove(path)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Не дождались блокировки {path}")
+            time.sleep(poll)
+    # PID и случайный хвост: блокировку могут брать и потоки одного процесса
+    owner = f"{os.getpid()}:{os.urandom(4).hex()}"
+    refreshed = time.monotonic()
+
+    def refresh():
+        nonlocal refreshed
+        now = time.monotonic()
+        if now - refreshed < stale / 10:
+            return
+        refreshed = now
+        if _read_lock_owner(path) == owner:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    try:
+        os.write(fd, owner.encode("ascii"))
+        os.close(fd)
+        fd = None
+        yield refresh
+    finally:
+        if fd is not None:
+            os.close(fd)
+        # Если файл признали брошенным и блокировку взял другой процесс — его не трогаем
+        if _read_lock_owner(path) == owner:
+            try:
+                os.remove(path)
+            except OSError:
                 pass
 
+def _index_lock():
+    return file_lock(_cache_index_path() + ".lock", timeout=60.0, stale=120.0)
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _pick_model_entry(names):
+    # Детерминированный выбор: сначала самый неглубокий, затем по имени
+    found = [n for n in names if n.lower().endswith((".glb", ".gltf"))]
+    if not found:
+        raise RuntimeError("Файл модели не найден в архиве")
+    return min(found, key=lambda n: (n.count("/"), n))
+
+def _read_glb_json(f):
+    # Заголовок GLB (12 байт) и первый чанк — JSON; бинарный чанк не читаем
+    magic, _, _ = struct.unpack("<4sII", f.read(12))
+    chunk_len, chunk_type = struct.unpack("<II", f.read(8))
+    if magic != b"glTF" or chunk_type != 0x4E4F534A:
+        raise RuntimeError("Повреждённый GLB в архиве")
+    return json.loads(f.read(chunk_len).decode("utf-8"))
+
+def _referenced_members(z, entry):
+    # Внешние buffers/images, на которые ссылается glTF, в виде имён внутри архива
+    with z.open(entry) as f:
+        if entry.lower().endswith(".glb"):
+            gltf = _read_glb_json(f)
+        else:
+            gltf = json.loads(f.read().decode("utf-8"))
+    base = posixpath.dirname(entry)
+    names = set(z.namelist())
+    members = set()
+    for item in gltf.get("buffers", []) + gltf.get("images", []):
+        uri = item.get("uri")
+        if not uri or uri.startswith("data:"):
+            continue
+        name = posixpath.normpath(posixpath.join(base, unquote(uri)))
+        if name in names:
+            members.add(name)
+        else:
+            print(f"В архиве нет файла, на который ссылается модель: {name}")
+    return sorted(members)
+
+def _extract_members(zip_path, members, dest, workers=4):
+    root = os.path.realpath(dest)
+
+    def extract(name):
+        target = os.path.realpath(os.path.join(root, name))
+        if not target.startswith(root + os.sep):
+            raise RuntimeError(f"Недопустимый путь в архиве: {name}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # У каждого потока свой дескриптор архива: ZipFile не потокобезопасен
+        with zipfile.ZipFile(zip_path, "r") as z, z.open(name) as src, open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+        return os.path.getsize(target)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(members)))) as pool:
+        return sum(pool.map(extract, members))
+
+def _evict_cache(index, limit_bytes, keep=None):
+    blobs = index["blobs"]
+    total = sum(b.get("size", 0) for b in blobs.values())
+    for digest in sorted(blobs, key=lambda d: blobs[d].get("last_used", 0)):
+        if total <= limit_bytes:
+            break
+        if digest == keep:
+            continue
+        total -= blobs.pop(digest).get("size", 0)
+        shutil.rmtree(os.path.join(MODEL_CACHE_DIR, digest), ignore_errors=True)
+    index["uids"] = {u: d for u, d in index["uids"].items() if d in blobs}
+
+def cache_lookup(model_uid):
+    with _index_lock():
+        index = _load_cache_index()
+        digest = index["uids"].get(model_uid)
+        blob = index["blobs"].get(digest) if digest else None
+        if blob is None:
+            return None
+        entry_path = os.path.join(MODEL_CACHE_DIR, digest, blob["entry"])
+        if not os.path.isfile(entry_path):
+            # Файлы удалили вручную — забываем запись
+            index["blobs"].pop(digest, None)
+            index["uids"].pop(model_uid, None)
+            _save_cache_index(index)
+            return None
+        blob["last_used"] = time.time()
+        _save_cache_index(index)
+        return entry_path
+
+def cache_store(model_uid, zip_path, limit_mb=MODEL_CACHE_LIMIT_MB):
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    digest = _file_sha256(zip_path)
+    blob_dir = os.path.join(MODEL_CACHE_DIR, digest)
+    index = _load_cache_index()
+    blob = index["blobs"].get(digest)
+    if blob is None or not os.path.isfile(os.path.join(blob_dir, blob["entry"])):
+        # Распаковываем рядом и переименовываем, чтобы не оставить полузаписанный каталог
+        staging = tempfile.mkdtemp(dir=MODEL_CACHE_DIR, prefix=".staging-")
+        try:
+            # Только сам glTF и файлы, на которые он ссылается: исходники
+            # и дубликаты текстур из архива Sketchfab на диск не попадают
+            with zipfile.ZipFile(zip_path, "r") as z:
+                entry = _pick_model_entry(n for n in z.namelist() if not n.endswith("/"))
+                members = [entry] + _referenced_members(z, entry)
+            size = _extract_members(zip_path, members, staging)
+            shutil.rmtree(blob_dir, ignore_errors=True)
+            os.replace(staging, blob_dir)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        blob = {"entry": entry, "size": size}
+    # Распаковка идёт без блокировки; индекс перечитывается под ней,
+    # чтобы не потерять записи, добавленные другими процессами
+    with _index_lock():
+        index = _load_cache_index()
+        blob = index["blobs"][digest] = dict(blob, last_used=time.time())
+        index["uids"][model_uid] = digest
+        _evict_cache(index, max(0, limit_mb) * 1024 * 1024, keep=digest)
+        _save_cache_index(index)
+    return os.path.join(blob_dir, blob["entry"])
+
+# ---------------------------
+# Sketchfab клиент
+# ---------------------------
+class BuildCancelled(Exception):
+    pass
+
+class SketchfabClient:
+    # Один keep-alive пул соединений на всё время работы Blender;
+    # повторы с экспоненциальной паузой и явные таймауты на каждый запрос.
+    def __init__(self, api_url=None, token=None, timeout=(5.0, 30.0),
+                 retries=3, backoff=0.5, search_ttl=SEARCH_CACHE_TTL,
+                 cache_path=None):
+        self.api_url    = (api_url or SKETCHFAB_API_URL).rstrip("/")
+        self.token      = token
+        self.timeout    = timeout
+        self.search_ttl = search_ttl
+        self.cache_path = cache_path or os.path.join(AR_CACHE_DIR, "search_cache.json")
+        self._memory    = {}
+        self._lock      = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def _headers(self):
+        token = SKETCHFAB_TOKEN if self.token is None else self.token
+        return {"Authorization": f"Token {token}"} if token else {}
+
+    def _get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            return self.session.get(url, **kwargs)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Sketchfab недоступен: {e}") from e
+
+    # --- кэш поиска: память + диск, с TTL ---
+    def _load_disk_cache(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_disk_cache(self, data):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _cached_search(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and now - hit["time"] < self.search_ttl:
+                return hit["results"]
+            hit = self._load_disk_cache().get(key)
+            if hit and now - hit["time"] < self.search_ttl:
+                self._memory[key] = hit
+                return hit["results"]
+        return None
+
+    def _store_search(self, key, results):
+        now = time.time()
+        entry = {"time": now, "results": results}
+        with self._lock:
+            self._memory[key] = entry
+            data = self._load_disk_cache()
+            data = {k: v for k, v in data.items() if now - v.get("time", 0) < self.search_ttl}
+            data[key] = entry
+            self._save_disk_cache(data)
+
+    def search(self, prompt, use_cache=True):
+        key = " ".join(prompt.lower().split())
+        if use_cache:
+            cached = self._cached_search(key)
+            if cached is not None:
+                return cached
+
+        r = self._get(
+            f"{self.api_url}/search",
+            params={"type": "models", "q": prompt, "downloadable": "true"},
+            headers=self._headers(),
+        )
+        if r.status_code != 200:
+            raise RuntimeError("Ошибка API Sketchfab")
+        results = [
+            {
+                "uid":       item["uid"],
+                "name":      item.get("name", item["uid"]),
+                "tags":      [t.get("name", "") for t in item.get("tags", [])],
+                "faceCount": item.get("faceCount"),
+            }
+            for item in r.json().get("results", [])
+            if item.get("uid")
+        ]
+        self._store_search(key, results)
+        return results
+
+    def gltf_download_url(self, model_uid):
+        # Ссылка на архив подписана и быстро истекает — её не кэшируем
+        r = self._get(f"{self.api_url}/models/{model_uid}/download", headers=self._headers())
+        if r.status_code != 200:
+            raise RuntimeError("Ошибка получения ссылки на скачивание")
+        gltf_url = r.json().get("gltf", {}).get("url")
+        if not gltf_url:
+            raise RuntimeError("GLTF недоступен для этой модели")
+        return gltf_url
+
+    def download(self, url, dest_path, chunk_size=1 << 16, progress=None, cancel=None):
+        written = 0
+        with self._get(url, stream=True) as r:
+            if r.status_code != 200:
+                raise RuntimeError(f"Ошибка скачивания архива: HTTP {r.status_code}")
+            total = int(r.headers.get("Content-Length") or 0)
+            with open(dest_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size):
+                    if cancel is not None and cancel.is_set():
+                        raise BuildCancelled()
+                    f.write(chunk)
+                    written += len(chunk)
+                    if progress:
+                        progress("Скачивание", written, total)
+        return written
+
+_sketchfab_client = None
+
+def get_sketchfab_client():
+    global _sketchfab_client
+    if _sketchfab_client is None:
+        _sketchfab_client = SketchfabClient()
+    return _sketchfab_client
+
+def close_sketchfab_client():
+    global _sketchfab_client
+    if _sketchfab_client is not None:
+        _sketchfab_client.close()
+        _sketchfab_client = None
+
 # ---------------------------
 # Sketchfab загрузка модели
 # ---------------------------
-def download_model_from_sketchfab(prompt):
-    url = f"https://api.sketchfab.com/v3/search?type=models&q={prompt}&downloadable=true"
-    headers = {"Authorization": f"Token {SKETCHFAB_TOKEN}"}
-    r = requests.get(url, headers=headers)
-    if r.status_code != 200:
-        raise RuntimeError("Ошибка API Sketchfab")
-    results = r.json().get('results', [])
+def download_model_from_sketchfab(prompt, cache_limit_mb=MODEL_CACHE_LIMIT_MB,
+                                  progress=None, cancel=None):
+    # progress(stage, done, total) и cancel (threading.Event) нужны фоновой сборке;
+    # функция не трогает bpy и может выполняться в рабочем потоке.
+    report = progress or (lambda stage, done=0, total=0: None)
+    client = get_sketchfab_client()
+    report("Поиск модели")
+    results = client.search(prompt)
     if not results:
         raise RuntimeError("Моделей не найдено по запросу")
     model_uid = results[0]['uid']
     name = results[0]['name']
-    print(f"Загрузка модели: {name}")
-
-    download_url = f"https://api.sketchfab.com/v3/models/{model_uid}/download"
-    r = requests.get(download_url, headers=headers)
-    if r.status_code != 200:
-        raise RuntimeError("Ошибка получения ссылки на скачивание")
-    gltf_url = r.json().get('gltf', {}).get('url')
-    if not gltf_url:
-        raise RuntimeError("GLTF недоступен для этой модели")
-
-    tmp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(tmp_dir, "model.zip")
-    r = requests.get(gltf_url, stream=True)
-    with open(zip_path, "wb") as f:
-        for chunk in r.iter_content(8192):
-            f.write(chunk)
-    with zipfile.ZipFile(zip_path, "r") as z:
-        z.extractall(tmp_dir)
-
-    for root, _, files in os.walk(tmp_dir):
-        for f in files:
-            if f.endswith((".glb", ".gltf")):
-                return os.path.join(root, f)
-    raise RuntimeError("Файл модели не найден в архиве")
+
+    # Один процесс качает модель, остальные (пакетная сборка) ждут и берут её из кэша
+    with file_lock(os.path.join(MODEL_CACHE_DIR, f".{model_uid}.lock")) as refresh_lock:
+        path = cache_lookup(model_uid)
+        if path:
+            print(f"Модель из кэша: {name}")
+        else:
+            print(f"Загрузка модели: {name}")
+            gltf_url = client.gltf_download_url(model_uid)
+            tmp_dir = tempfile.mkdtemp()
+            try:
+                zip_path = os.path.join(tmp_dir, "model.zip")
+                def download_progress(stage, done=0, total=0):
+                    # Живой владелец блокировки не должен выглядеть брошенным
+                    refresh_lock()
+                    report(stage, done, total)
+
+                client.download(gltf_url, zip_path, progress=download_progress, cancel=cancel)
+                if cancel is not None and cancel.is_set():
+                    raise BuildCancelled()
+                report("Распаковка")
+                path = cache_store(model_uid, zip_path, limit_mb=cache_limit_mb)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    _index_download(path, results[0], prompt)
+    return path
 
 # ---------------------------
-# Границы меша
+# Локальная библиотека моделей
 # ---------------------------
-def mesh_world_bounds(obj):
-    coords = [obj.matrix_world @ v.co for v in obj.data.vertices]
-    if not coords:
+LIBRARY_DB = os.path.join(AR_CACHE_DIR, "library.sqlite")
+
+LIBRARY_MODES = [
+    ('LOCAL_FIRST', "Сначала библиотека", "Искать в локальной библиотеке, Sketchfab — только при промахе"),
+    ('ONLINE',      "Только Sketchfab",   "Всегда искать через API Sketchfab"),
+    ('OFFLINE',     "Только библиотека",  "Без сети: модели нет в библиотеке — ошибка"),
+]
+
+# Вес совпадения слова запроса в зависимости от того, откуда слово в индексе
+LIBRARY_WEIGHTS = {"name": 3.0, "tags": 2.0, "dirs": 1.0, "parts": 0.5}
+# Запрос считается найденным в библиотеке, только если каждое его слово точно
+# совпало со словом имени или тега; совпадения по началу слова, по каталогам
+# и именам мешей участвуют в ранжировании search, но lookup их пропускает —
+# в LOCAL_FIRST такой запрос уходит в Sketchfab
+LIBRARY_HIT_WEIGHT = LIBRARY_WEIGHTS["tags"]
+
+LIBRARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    path      TEXT PRIMARY KEY,
+    root      TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    tags      TEXT NOT NULL,
+    triangles INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    bbox      TEXT,
+    mtime_ns  INTEGER NOT NULL,
+    uid       TEXT,
+    source    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term   TEXT NOT NULL,
+    path   TEXT NOT NULL,
+    weight REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS terms_term ON terms(term);
+CREATE INDEX IF NOT EXISTS terms_path ON terms(path);
+CREATE TABLE IF NOT EXISTS roots (
+    root    TEXT PRIMARY KEY,
+    scanned REAL NOT NULL
+);
+"""
+
+def library_tokens(text):
+    return [t for t in re.findall(r"[^\W_]+", text.lower()) if len(t) > 1 or t.isdigit()]
+
+def _gltf_node_matrix(node):
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get("rotation", (0.0, 0.0, 0.0, 1.0))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w),     2 * (x * z + y * w)],
+        [2 * (x * y + z * w),     1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w),     2 * (y * z + x * w),     1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get("scale", (1.0, 1.0, 1.0)))
+    matrix[:3, 3]  = node.get("translation", (0.0, 0.0, 0.0))
+    return matrix
+
+def _primitive_triangles(gltf, prim):
+    accessors = gltf.get("accessors", [])
+    if "indices" in prim:
+        count = accessors[prim["indices"]]["count"]
+    else:
+        count = accessors[prim["attributes"]["POSITION"]]["count"]
+    mode = prim.get("mode", 4)
+    if mode == 4:
+        return count // 3
+    if mode in (5, 6):  # TRIANGLE_STRIP, TRIANGLE_FAN
+        return max(0, count - 2)
+    return 0
+
+def gltf_model_info(path):
+    # Имя, теги, число треугольников, размер и рамка модели — только из JSON-части
+    # glTF: бинарные буферы не читаются, поэтому индексация каталога идёт быстро.
+    # Рамка — по min/max атрибутов POSITION с учётом трансформаций узлов (оси glTF, Y вверх)
+    with open(path, "rb") as f:
+        if path.lower().endswith(".glb"):
+            gltf = _read_glb_json(f)
+        else:
+            gltf = json.loads(f.read().decode("utf-8"))
+
+    size = os.path.getsize(path)
+    base = os.path.dirname(path)
+    for item in gltf.get("buffers", []) + gltf.get("images", []):
+        uri = item.get("uri")
+        if uri and not uri.startswith("data:"):
+            try:
+                size += os.path.getsize(os.path.join(base, unquote(uri)))
+            except OSError:
+                pass
+
+    nodes  = gltf.get("nodes", [])
+    meshes = gltf.get("meshes", [])
+    scenes = gltf.get("scenes", [])
+    if scenes:
+        roots = scenes[gltf.get("scene", 0)].get("nodes", [])
+    else:
+        children = {c for n in nodes for c in n.get("children", [])}
+        roots = [i for i in range(len(nodes)) if i not in children]
+
+    triangles = 0
+    lo, hi = np.full(3, np.inf), np.full(3, -np.inf)
+    stack = [(i, np.eye(4)) for i in roots]
+    while stack:
+        index, parent = stack.pop()
+        node   = nodes[index]
+        matrix = parent @ _gltf_node_matrix(node)
+        stack.extend((c, matrix) for c in node.get("children", []))
+        if "mesh" not in node:
+            continue
+        for prim in meshes[node["mesh"]].get("primitives", []):
+            triangles += _primitive_triangles(gltf, prim)
+            accessor = gltf["accessors"][prim["attributes"]["POSITION"]]
+            if "min" not in accessor or "max" not in accessor:
+                continue
+            corners = np.array([[x, y, z, 1.0] for x in (accessor["min"][0], accessor["max"][0])
+                                               for y in (accessor["min"][1], accessor["max"][1])
+                                               for z in (accessor["min"][2], accessor["max"][2])])
+            world = (corners @ matrix.T)[:, :3]
+            lo = np.minimum(lo, world.min(axis=0))
+            hi = np.maximum(hi, world.max(axis=0))
+
+    extras = gltf.get("asset", {}).get("extras", {})
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem.lower() in ("scene", "model"):
+        stem = os.path.basename(base) or stem
+    tags = extras.get("tags", [])
+    return {
+        "name": extras.get("title") or stem,
+        "tags": [str(t) for t in tags] if isinstance(tags, list) else [],
+        "parts": sorted({m.get("name", "") for m in meshes} - {""}),
+        "triangles": triangles,
+        "size": size,
+        "bbox": [lo.tolist(), hi.tolist()] if np.isfinite(lo).all() else None,
+    }
+
+def _library_root(directory):
+    return os.path.normpath(os.path.abspath(os.path.expanduser(directory)))
+
+class ModelLibrary:
+    # Постоянный индекс моделей в sqlite: локальные каталоги с .glb/.gltf и всё,
+    # что скачано со Sketchfab. Поиск — по обратному индексу слов (terms), так что
+    # запрос отвечает за миллисекунды без сети. Одно соединение на процесс под
+    # замком: им пользуются и главный поток, и рабочий поток загрузки.
+    def __init__(self, db_path=None):
+        self.db_path = db_path or LIBRARY_DB
+        self._conn   = None
+        self._lock   = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(LIBRARY_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _put(self, conn, path, root, info, mtime_ns, dirs=(), uid=None, source='local'):
+        terms = {}
+        for kind, words in (("parts", info["parts"]), ("dirs", dirs),
+                            ("tags", info["tags"]), ("name", [info["name"]])):
+            for token in library_tokens(" ".join(words)):
+                terms[token] = max(terms.get(token, 0.0), LIBRARY_WEIGHTS[kind])
+        conn.execute("INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     (path, root, info["name"], json.dumps(info["tags"], ensure_ascii=False),
+                      info["triangles"], info["size"], json.dumps(info["bbox"]), mtime_ns, uid, source))
+        conn.execute("DELETE FROM terms WHERE path = ?", (path,))
+        conn.executemany("INSERT INTO terms VALUES (?, ?, ?)", [(t, path, w) for t, w in terms.items()])
+
+    def _remove(self, conn, paths):
+        conn.executemany("DELETE FROM models WHERE path = ?", [(p,) for p in paths])
+        conn.executemany("DELETE FROM terms WHERE path = ?", [(p,) for p in paths])
+
+    def add(self, path, name=None, tags=(), uid=None, source='sketchfab'):
+        path = os.path.abspath(path)
+        info = gltf_model_info(path)
+        if name:
+            info["name"] = name
+        info["tags"] = sorted(set(info["tags"]) | set(tags))
+        with self._lock:
+            conn = self._db()
+            with conn:
+                self._put(conn, path, _library_root(os.path.dirname(path)), info,
+                          os.stat(path).st_mtime_ns, uid=uid, source=source)
+
+    def scan(self, directories):
+        # Инкрементально: разбираются только новые и изменившиеся файлы (по mtime),
+        # исчезнувшие удаляются из индекса
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": 0}
+        with self._lock:
+            conn = self._db()
+            for directory in directories:
+                root = _library_root(directory)
+                if not os.path.isdir(root):
+                    print(f"Каталог библиотеки не найден: {root}")
+                    continue
+                known = dict(conn.execute("SELECT path, mtime_ns FROM models WHERE root = ? AND source = 'local'",
+                                          (root,)))
+                seen = set()
+                with conn:
+                    for dirpath, _, filenames in os.walk(root):
+                        dirs = os.path.relpath(dirpath, root).split(os.sep)
+                        for filename in filenames:
+                            if not filename.lower().endswith((".glb", ".gltf")):
+                                continue
+                            path = os.path.join(dirpath, filename)
+                            seen.add(path)
+                            mtime_ns = os.stat(path).st_mtime_ns
+                            if known.get(path) == mtime_ns:
+                                stats["unchanged"] += 1
+                                continue
+                            try:
+                                info = gltf_model_info(path)
+                            except (OSError, ValueError, KeyError, IndexError, RuntimeError, struct.error) as e:
+                                print(f"Не удалось разобрать {path}: {e}")
+                                stats["failed"] += 1
+                                continue
+                            self._put(conn, path, root, info, mtime_ns,
+                                      dirs=[d for d in dirs if d != "."] + [os.path.splitext(filename)[0]])
+                            stats["updated" if path in known else "added"] += 1
+                    gone = [p for p in known if p not in seen]
+                    self._remove(conn, gone)
+                    stats["removed"] += len(gone)
+                    conn.execute("INSERT OR REPLACE INTO roots VALUES (?, ?)", (root, time.time()))
+        return stats
+
+    def is_scanned(self, directory):
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM roots WHERE root = ?",
+                                      (_library_root(directory),)).fetchone() is not None
+
+    def search(self, query, limit=10):
+        # Каждое слово запроса совпадает с началом слова в индексе (точное — вдвое
+        # весомее); выше те, где совпало больше слов, затем больше точных совпадений
+        # с именем или тегами, затем по весу, затем легче
+        tokens = library_tokens(query)
+        if not tokens:
+            return []
+        parts, params = [], []
+        for i, token in enumerate(tokens):
+            parts.append(f"SELECT {i} AS q, path, "
+                         f"MAX(weight * (CASE WHEN term = ? THEN 1.0 ELSE 0.5 END)) AS score, "
+                         f"MAX(term = ? AND weight >= ?) AS exact "
+                         f"FROM terms WHERE term >= ? AND term < ? GROUP BY path")
+            params += [token, token, LIBRARY_HIT_WEIGHT, token, token + "\uffff"]
+        sql = ("SELECT m.path, m.name, m.tags, m.triangles, m.size, m.bbox, m.uid, m.source, "
+               "hits.matched, hits.exact, hits.score FROM ("
+               "SELECT path, COUNT(q) AS matched, SUM(exact) AS exact, SUM(score) AS score FROM ("
+               + " UNION ALL ".join(parts) +
+               ") GROUP BY path) AS hits JOIN models AS m ON m.path = hits.path "
+               "ORDER BY hits.matched DESC, hits.exact DESC, hits.score DESC, m.triangles ASC LIMIT ?")
+        with self._lock:
+            rows = self._db().execute(sql, params + [limit]).fetchall()
+        return [{
+            "path": path, "name": name, "tags": json.loads(tags), "triangles": triangles,
+            "size": size, "bbox": json.loads(bbox), "uid": uid, "source": source,
+            "score": score, "complete": matched == len(tokens), "exact": exact == len(tokens),
+        } for path, name, tags, triangles, size, bbox, uid, source, matched, exact, score in rows]
+
+    def lookup(self, query):
+        # Лучшее точное совпадение по всем словам запроса (см. LIBRARY_HIT_WEIGHT);
+        # записи об удалённых файлах (например, вытесненных из кэша моделей)
+        # выбрасываются по дороге
+        for hit in self.search(query, limit=20):
+            if not hit["exact"]:
+                break
+            if os.path.isfile(hit["path"]):
+                return hit
+            with self._lock:
+                conn = self._db()
+                with conn:
+                    self._remove(conn, [hit["path"]])
         return None
-    min_v = Vector((min(c.x for c in coords), min(c.y for c in coords), min(c.z for c in coords)))
-    max_v = Vector((max(c.x for c in coords), max(c.y for c in coords), max(c.z for c in coords)))
+
+_model_library = None
+
+def get_model_library():
+    global _model_library
+    if _model_library is None:
+        _model_library = ModelLibrary()
+    return _model_library
+
+def close_model_library():
+    global _model_library
+    if _model_library is not None:
+        _model_library.close()
+        _model_library = None
+
+def library_directories(scene):
+    return [bpy.path.abspath(d.strip()) for d in scene.ar_library_dirs.split(";") if d.strip()]
+
+def resolve_options(scene):
+    # Аргументы resolve_model из свойств сцены; читать их можно только в главном потоке
+    return {"mode": scene.ar_library_mode, "directories": library_directories(scene),
+            "cache_limit_mb": scene.ar_cache_limit_mb}
+
+def _index_download(path, result, prompt):
+    # Скачанная модель попадает в библиотеку с именем и тегами Sketchfab и самим
+    # запросом: повтор того же запроса дальше решается без сети
+    try:
+        get_model_library().add(path, name=result["name"], tags=list(result.get("tags", [])) + [prompt],
+                                uid=result["uid"])
+    except (sqlite3.Error, OSError, ValueError, KeyError, IndexError, RuntimeError, struct.error) as e:
+        print(f"Не удалось добавить модель в библиотеку: {e}")
+
+def resolve_model(prompt, mode='LOCAL_FIRST', directories=(), cache_limit_mb=MODEL_CACHE_LIMIT_MB,
+                  progress=None, cancel=None):
+    # Запрос → путь к модели: сначала локальная библиотека, при промахе Sketchfab.
+    # Как и download_model_from_sketchfab, не трогает bpy и годится для рабочего потока
+    if mode != 'ONLINE':
+        if progress:
+            progress("Локальная библиотека")
+        library = get_model_library()
+        try:
+            pending = [d for d in directories if not library.is_scanned(d)]
+            if pending:
+                library.scan(pending)
+            hit = library.lookup(prompt)
+        except sqlite3.Error as e:
+            print(f"Локальная библиотека недоступна: {e}")
+            hit = None
+        if hit:
+            print(f"Модель из библиотеки: {hit['name']}")
+            return hit["path"]
+        if mode == 'OFFLINE':
+            raise RuntimeError("В локальной библиотеке нет модели по запросу")
+    return download_model_from_sketchfab(prompt, cache_limit_mb=cache_limit_mb, progress=progress, cancel=cancel)
+
+# ---------------------------
+# Границы меша
+# ---------------------------
+_mesh_stamps  = {}  # session_uid меша -> счётчик изменений геометрии
+_bounds_cache = {}  # (session_uid объекта, режим) -> (отпечаток, габариты)
+
+@bpy.app.handlers.persistent
+def _track_geometry_updates(scene, depsgraph):
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        data = update.id.original
+        if isinstance(data, bpy.types.Object):
+            data = data.data
+        if isinstance(data, bpy.types.Mesh):
+            _mesh_stamps[data.session_uid] = _mesh_stamps.get(data.session_uid, 0) + 1
+
+def _bounds_stamp(obj):
+    # Меняется при трансформации объекта, замене меша и правке его геометрии
+    mesh = obj.data if obj.type == 'MESH' else None
+    mesh_uid = mesh.session_uid if mesh is not None else None
+    return (
+        mesh_uid,
+        _mesh_stamps.get(mesh_uid, 0),
+        len(mesh.vertices) if mesh is not None else 0,
+        tuple(v for row in obj.matrix_world for v in row),
+    )
+
+def cached_bounds(obj, compute, mode=None):
+    key   = (obj.session_uid, mode)
+    stamp = _bounds_stamp(obj)
+    hit   = _bounds_cache.get(key)
+    if hit is None or hit[0] != stamp:
+        hit = (stamp, compute(obj))
+        _bounds_cache[key] = hit
+    # Копии, чтобы вызывающий код не испортил закэшированные векторы
+    return tuple(v.copy() for v in hit[1]) if hit[1] is not None else None
+
+def clear_bounds_cache():
+    _bounds_cache.clear()
+
+def world_coords(obj):
+    # Координаты вершин в мировом пространстве одним массивом (N, 3)
+    mesh = obj.data
+    n = len(mesh.vertices)
+    co = np.empty(n * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    return co.reshape(n, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+def bound_box_world_coords(obj):
+    matrix = np.array(obj.matrix_world, dtype=np.float64)
+    return np.array(obj.bound_box, dtype=np.float64) @ matrix[:3, :3].T + matrix[:3, 3]
+
+def mesh_world_bounds(obj, precise=True):
+    # precise=False — быстрый режим по 8 углам bound_box (как precise_bounds в newDome.py):
+    # не зависит от числа вершин, но для повёрнутой модели даёт рамку с запасом
+    return cached_bounds(obj, lambda o: _compute_mesh_world_bounds(o, precise), mode=precise)
+
+def _compute_mesh_world_bounds(obj, precise):
+    if precise:
+        if not len(obj.data.vertices):
+            return None
+        coords = world_coords(obj)
+    else:
+        coords = bound_box_world_coords(obj)
+    min_v = Vector(coords.min(axis=0))
+    max_v = Vector(coords.max(axis=0))
     center = (min_v + max_v) / 2.0
     extents = max_v - min_v
     return min_v, max_v, center, extents
 
+def model_bounds(root, precise=True):
+    # Габариты всей иерархии модели: объединение (кэшированных) рамок её мешей,
+    # так что не важно, слиты части в один объект или остались отдельными
+    boxes = [b for b in (mesh_world_bounds(o, precise) for o in model_mesh_objects(root)) if b]
+    if not boxes:
+        return None
+    min_v = Vector(np.min([b[0] for b in boxes], axis=0))
+    max_v = Vector(np.max([b[1] for b in boxes], axis=0))
+    return min_v, max_v, (min_v + max_v) / 2.0, max_v - min_v
+
 # ---------------------------
 # Импорт модели
 # ---------------------------
-def import_model(filepath, plane, rotation=(0,0,0)):
+IMPORT_MODES = [
+    ('MERGE',     "Слияние (data API)", "Все части сливаются в один меш пакетно через foreach_get/foreach_set"),
+    ('HIERARCHY', "Иерархия",           "Части остаются отдельными объектами под AR_Model, инстансы сохраняются"),
+    ('JOIN',      "bpy.ops.object.join", "Прежний путь через выделение и оператор объединения"),
+]
+
+def model_mesh_objects(root):
+    return [o for o in root.children_recursive if o.type == 'MESH']
+
+def _corner_colors(mesh, attr, vertex_index):
+    n = len(mesh.loops) if attr.domain == 'CORNER' else len(mesh.vertices)
+    colors = np.empty(n * 4, dtype=np.float32)
+    attr.data.foreach_get("color", colors)
+    colors = colors.reshape(n, 4)
+    return colors if attr.domain == 'CORNER' else colors[vertex_index]
+
+_MERGE_BLOCKING_TYPES = {'CAMERA': "камеры", 'LIGHT': "источники света", 'ARMATURE': "арматура"}
+
+def merge_blockers(objects):
+    # Что не переживёт слияние в один статичный меш: объекты не-меши остались бы
+    # без родителя, а скиннинг и ключи формы слились бы из позы покоя
+    reasons = set()
+    for o in objects:
+        if o.type == 'MESH':
+            if o.data.shape_keys is not None:
+                reasons.add("ключи формы")
+            if any(m.type == 'ARMATURE' for m in o.modifiers):
+                reasons.add("скиннинг")
+        elif o.type != 'EMPTY':
+            reasons.add(_MERGE_BLOCKING_TYPES.get(o.type, o.type.lower()))
+    return sorted(reasons)
+
+def merge_meshes(parts, name):
+    # Аналог object.join без выделения и операторов: вершины уже в мировых
+    # координатах, индексы материалов переотображаются в общий список слотов
+    # (часть без материалов получает пустой слот), UV, цвета (в домене углов),
+    # пользовательские нормали и рёбра без граней переносятся
+    meshes = [p.data for p in parts]
+    nv = sum(len(m.vertices) for m in meshes)
+    nl = sum(len(m.loops) for m in meshes)
+    nf = sum(len(m.polygons) for m in meshes)
+
+    co         = np.empty((nv, 3), dtype=np.float32)
+    loop_vert  = np.empty(nl, dtype=np.int32)
+    loop_start = np.empty(nf, dtype=np.int32)
+    mat_index  = np.zeros(nf, dtype=np.int32)
+    smooth     = np.empty(nf, dtype=bool)
+    normals    = np.zeros((nl, 3), dtype=np.float32)
+    has_custom = any(m.has_custom_normals for m in meshes)
+    uv_names   = list(dict.fromkeys(uv.name for m in meshes for uv in m.uv_layers))
+    uvs        = {uv_name: np.zeros((nl, 2), dtype=np.float32) for uv_name in uv_names}
+    col_names  = list(dict.fromkeys(a.name for m in meshes for a in m.color_attributes))
+    colors     = {c: np.ones((nl, 4), dtype=np.float32) for c in col_names}
+    loose      = []
+    materials  = []
+
+    v_off = l_off = f_off = 0
+    for part, mesh in zip(parts, meshes):
+        n, l, f = len(mesh.vertices), len(mesh.loops), len(mesh.polygons)
+        co[v_off:v_off + n] = world_coords(part)
+
+        idx = np.empty(l, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", idx)
+        loop_vert[l_off:l_off + l] = idx + v_off
+
+        tmp = np.empty(f, dtype=np.int32)
+        mesh.polygons.foreach_get("loop_start", tmp)
+        loop_start[f_off:f_off + f] = tmp + l_off
+
+        flags = np.empty(f, dtype=bool)
+        mesh.polygons.foreach_get("use_smooth", flags)
+        smooth[f_off:f_off + f] = flags
+
+        remap = []
+        for mat in [s.material for s in part.material_slots] or [None]:
+            if mat not in materials:
+                materials.append(mat)
+            remap.append(materials.index(mat))
+        mesh.polygons.foreach_get("material_index", tmp)
+        mat_index[f_off:f_off + f] = np.asarray(remap, dtype=np.int32)[np.clip(tmp, 0, len(remap) - 1)]
+
+        # Рёбра, на которые не ссылается ни один угол, update(calc_edges) не восстановит
+        ne = len(mesh.edges)
+        if ne:
+            used = np.zeros(ne, dtype=bool)
+            corner_edges = np.empty(l, dtype=np.int32)
+            mesh.loops.foreach_get("edge_index", corner_edges)
+            used[corner_edges] = True
+            if not used.all():
+                edge_verts = np.empty(ne * 2, dtype=np.int32)
+                mesh.edges.foreach_get("vertices", edge_verts)
+                loose.append(edge_verts.reshape(ne, 2)[~used] + v_off)
+
+        for uv in mesh.uv_layers:
+            data = np.empty(l * 2, dtype=np.float32)
+            uv.data.foreach_get("uv", data)
+            uvs[uv.name][l_off:l_off + l] = data.reshape(l, 2)
+
+        for attr in mesh.color_attributes:
+            colors[attr.name][l_off:l_off + l] = _corner_colors(mesh, attr, idx)
+
+        if has_custom:
+            data = np.empty(l * 3, dtype=np.float32)
+            mesh.corner_normals.foreach_get("vector", data)
+            # Нормали переносятся матрицей, обратной к транспонированной
+            normal_matrix = np.linalg.inv(np.array(part.matrix_world)[:3, :3]).T
+            nrm = data.reshape(l, 3) @ normal_matrix.T
+            nrm /= np.maximum(np.linalg.norm(nrm, axis=1, keepdims=True), 1e-12)
+            normals[l_off:l_off + l] = nrm
+
+        v_off += n
+        l_off += l
+        f_off += f
+
+    # Вершины без рёбер и граней переносятся вместе со всеми остальными
+    merged = bpy.data.meshes.new(name)
+    merged.vertices.add(nv)
+    merged.loops.add(nl)
+    merged.polygons.add(nf)
+    merged.vertices.foreach_set("co", co.ravel())
+    if loose:
+        loose = np.concatenate(loose)
+        merged.edges.add(len(loose))
+        merged.edges.foreach_set("vertices", loose.ravel())
+    merged.loops.foreach_set("vertex_index", loop_vert)
+    merged.polygons.foreach_set("loop_start", loop_start)
+    merged.polygons.foreach_set("material_index", mat_index)
+    merged.polygons.foreach_set("use_smooth", smooth)
+    if any(mat is not None for mat in materials):
+        for mat in materials:
+            merged.materials.append(mat)
+    for uv_name, data in uvs.items():
+        merged.uv_layers.new(name=uv_name).data.foreach_set("uv", data.ravel())
+    for col_name, data in colors.items():
+        merged.color_attributes.new(col_name, 'FLOAT_COLOR', 'CORNER').data.foreach_set("color", data.ravel())
+    merged.update(calc_edges=True)
+    if has_custom:
+        merged.normals_split_custom_set(normals)
+    return merged
+
+def import_model(filepath, plane, rotation=(0,0,0), mode='MERGE'):
+    root = import_model_geometry(filepath, mode)
+    place_model(root, plane, rotation)
+    return root
+
+def import_model_geometry(filepath, mode='MERGE', stats=None):
+    # Новые объекты определяются по разнице bpy.data.objects до и после импорта,
+    # а не по выделению, поэтому функция работает и без контекста 3D-вида.
+    # В stats (если передан) пишутся время импорта glTF, сборки частей и число частей
+    stats = {} if stats is None else stats
+    start = time.perf_counter()
+    before = {o.session_uid for o in bpy.data.objects}
     bpy.ops.import_scene.gltf(filepath=filepath)
-    imported = [o for o in bpy.context.selected_objects if o.type == 'MESH']
+    created = [o for o in bpy.data.objects if o.session_uid not in before]
+    imported = [o for o in created if o.type == 'MESH']
     if not imported:
         raise RuntimeError("Импортированная модель не содержит мешей")
+    assembled = time.perf_counter()
+    stats["gltf_import_s"] = round(assembled - start, 4)
+    stats["parts"] = len(imported)
 
-    bpy.ops.object.select_all(action='DESELECT')
-    for o in imported:
-        o.select_set(True)
-    bpy.context.view_layer.objects.active = imported[0]
-    bpy.ops.object.join()
-    joined = bpy.context.active_object
-    joined.name = "AR_Model_Geom"
+    root = bpy.data.objects.new("AR_Model", None)
+    root.empty_display_type = 'PLAIN_AXES'
+    collection = imported[0].users_collection[0]
+    collection.objects.link(root)
 
-    bpy.ops.object.empty_add(type='PLAIN_AXES', location=(0,0,0))
-    root = bpy.context.active_object
-    root.name = "AR_Model"
+    blockers = merge_blockers(created) if mode == 'MERGE' else []
+    if blockers:
+        print(f"Слияние недоступно ({', '.join(blockers)}): части модели оставлены иерархией")
+        stats["merge_fallback"] = ", ".join(blockers)
+        mode = 'HIERARCHY'
+
+    if mode == 'HIERARCHY':
+        # Части остаются как есть; корень стоит в начале координат,
+        # поэтому мировые трансформации частей при перепривязке не меняются
+        for o in created:
+            if o.parent is None:
+                o.parent = root
+        stats["assemble_s"] = round(time.perf_counter() - assembled, 4)
+        return root
+
+    if mode == 'JOIN':
+        bpy.ops.object.select_all(action='DESELECT')
+        for o in imported:
+            o.select_set(True)
+        bpy.context.view_layer.objects.active = imported[0]
+        bpy.ops.object.join()
+        joined = bpy.context.active_object
+    else:
+        bpy.context.view_layer.update()
+        mesh = merge_meshes(imported, "AR_Model_Geom")
+        joined = bpy.data.objects.new("AR_Model_Geom", mesh)
+        collection.objects.link(joined)
+        meshes = {o.data for o in imported}
+        bpy.data.batch_remove([o for o in created if o.type in {'MESH', 'EMPTY'}])
+        bpy.data.batch_remove([m for m in meshes if m.users == 0])
+
+    joined.name = "AR_Model_Geom"
     joined.parent = root
     joined.matrix_parent_inverse = root.matrix_world.inverted()
+    stats["assemble_s"] = round(time.perf_counter() - assembled, 4)
+    return root
 
+def place_model(root, plane, rotation=(0,0,0)):
+    # Поворот, масштаб под высоту плоскости и постановка на «пол»;
+    # трансформация задаётся заново, поэтому повторный вызов безопасен
+    root.location = (0,0,0)
+    root.scale = (1,1,1)
     base_rot = (math.radians(-90),0,0)
     user_rot = tuple(math.radians(a) for a in rotation)
     root.rotation_euler = (base_rot[0]+user_rot[0], base_rot[1]+user_rot[1], base_rot[2]+user_rot[2])
@@ -147,7 +1381,7 @@ def import_model(filepath, plane, rotation=(0,0,0)):
     bpy.context.view_layer.update()
 
     # Масштабирование по высоте
-    mb = mesh_world_bounds(joined)
+    mb = model_bounds(root)
     if mb:
         min_v, max_v, _, _ = mb
         model_height = max_v.z - min_v.z if max_v.z > min_v.z else 1.0
@@ -157,89 +1391,471 @@ def import_model(filepath, plane, rotation=(0,0,0)):
 
     bpy.context.view_layer.update()
 
-    coords_after = [joined.matrix_world @ v.co for v in joined.data.vertices]
-    min_z_after = min((c.z for c in coords_after), default=0.0)
+    mb = model_bounds(root)
+    min_z_after = mb[0].z if mb else 0.0
     root.location.z -= min_z_after
     root.location.y = -plane.dimensions.y*0.5
     return root
 
+# ---------------------------
+# LOD модели
+# ---------------------------
+LOD_MODIFIER = "AR_LOD"
+
+def triangle_count(mesh):
+    totals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", totals)
+    return int((totals - 2).sum())
+
+def model_triangle_count(root, evaluated=False):
+    depsgraph = bpy.context.evaluated_depsgraph_get() if evaluated else None
+    total = 0
+    for obj in model_mesh_objects(root):
+        if depsgraph is not None:
+            obj = obj.evaluated_get(depsgraph)
+        total += triangle_count(obj.data)
+    return total
+
+def apply_lod(root, budget, enabled=True):
+    # Прореживание модификатором Decimate: исходные меши не трогаются, полная
+    # детализация возвращается выключением модификатора (см. set_lod_enabled)
+    parts  = model_mesh_objects(root)
+    before = model_triangle_count(root)
+    ratio  = min(1.0, budget / before) if before else 1.0
+    for obj in parts:
+        mod = obj.modifiers.get(LOD_MODIFIER)
+        if ratio >= 1.0:
+            if mod is not None:
+                obj.modifiers.remove(mod)
+            continue
+        if mod is None:
+            mod = obj.modifiers.new(LOD_MODIFIER, 'DECIMATE')
+        mod.decimate_type = 'COLLAPSE'
+        mod.ratio = ratio
+        mod.use_collapse_triangulate = True
+        mod.show_viewport = mod.show_render = enabled
+    bpy.context.view_layer.update()
+    return {"before": before, "after": model_triangle_count(root, evaluated=True), "ratio": ratio}
+
+def set_lod_enabled(root, enabled):
+    for obj in model_mesh_objects(root):
+        mod = obj.modifiers.get(LOD_MODIFIER)
+        if mod is not None:
+            mod.show_viewport = mod.show_render = enabled
+
+def format_lod_stats(stats):
+    return f"треугольники: {stats['before']:,} → {stats['after']:,}".replace(",", " ")
+
+def _lod_toggled(self, context):
+    root = bpy.data.objects.get("AR_Model")
+    if root is not None:
+        set_lod_enabled(root, self.ar_lod_enabled)
+
+# ---------------------------
+# Текстуры модели
+# ---------------------------
+TEXTURE_FORMATS = [
+    ('KEEP', "Как есть", "Сохранить исходный формат картинок"),
+    ('JPEG', "JPEG",     "Перекодировать в JPEG (картинки, чью альфу читает материал, остаются PNG)"),
+    ('WEBP', "WebP",     "Перекодировать в WebP"),
+]
+_TEXTURE_EXT = {'PNG': ".png", 'JPEG': ".jpg", 'WEBP': ".webp"}
+
+def _node_tree_image_nodes(tree, seen):
+    for node in tree.nodes:
+        if node.type == 'TEX_IMAGE' and node.image is not None:
+            yield node
+        elif node.type == 'GROUP' and node.node_tree is not None and node.node_tree not in seen:
+            seen.add(node.node_tree)
+            yield from _node_tree_image_nodes(node.node_tree, seen)
+
+def model_image_nodes(root):
+    seen = set()
+    for obj in model_mesh_objects(root):
+        for slot in obj.material_slots:
+            mat = slot.material
+            if mat is None or mat.node_tree is None or mat.node_tree in seen:
+                continue
+            seen.add(mat.node_tree)
+            yield from _node_tree_image_nodes(mat.node_tree, seen)
+
+def model_images(root):
+    images = []
+    for node in model_image_nodes(root):
+        if node.image not in images:
+            images.append(node.image)
+    return images
+
+def model_alpha_images(root):
+    # Картинки с настоящей альфой: в файле есть альфа-канал (RGBA — 32 бита на
+    # пиксель, 128 у float) и материал подключает выход Alpha. У загруженной
+    # картинки channels почти всегда 4, поэтому по нему судить нельзя.
+    return {node.image for node in model_image_nodes(root)
+            if node.outputs["Alpha"].is_linked and node.image.depth in (32, 128)}
+
+def image_memory(img):
+    # Blender держит картинку распакованной: 4 канала по байту или по float
+    w, h = img.size
+    return w * h * 4 * (4 if img.is_float else 1)
+
+def _materialise_source(img):
+    # Исходник для записи обработанной версии: файл рядом с моделью или
+    # упакованные в GLB байты, выгруженные в кэш по хешу
+    if img.packed_file is not None:
+        data = img.packed_file.data
+        ext = _TEXTURE_EXT.get(img.file_format, ".png")
+        path = os.path.join(TEXTURE_CACHE_DIR, "src", hashlib.sha256(data).hexdigest() + ext)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+        return path
+    path = bpy.path.abspath(img.filepath)
+    return path if os.path.isfile(path) else None
+
+def _copy_image_settings(result, img):
+    result.colorspace_settings.name = img.colorspace_settings.name
+    result.alpha_mode = img.alpha_mode
+
+def _restore_source(img, source):
+    # Возврат обработанной картинки к исходнику; выгруженный из GLB исходник
+    # снова упаковывается, чтобы .blend не зависел от кэша
+    result = bpy.data.images.load(source, check_existing=True)
+    _copy_image_settings(result, img)
+    if os.path.dirname(source) == os.path.join(TEXTURE_CACHE_DIR, "src") and result.packed_file is None:
+        result.pack()
+    return result
+
+def processed_texture(img, max_size, image_format='KEEP', quality=90, keep_alpha=False):
+    # Обработанная версия картинки из кэша (или сама картинка); сцена не меняется.
+    # Обработанная картинка помнит свой исходник и его размер, поэтому смена
+    # настроек не пережимает уже уменьшенную версию и не грузит исходник заново.
+    source = img.get("ar_texture_source")
+    if source and not os.path.isfile(source):
+        source = None
+    if source and "ar_texture_source_size" in img:
+        w, h = img["ar_texture_source_size"]
+    elif source:
+        work = bpy.data.images.load(source)
+        w, h = work.size
+        bpy.data.images.remove(work)
+    else:
+        w, h = img.size
+    resize = bool(max_size) and max(w, h) > max_size
+    fmt = image_format
+    if fmt == 'JPEG' and keep_alpha:
+        fmt = 'PNG'
+    if fmt == 'KEEP' and not resize:
+        # Делать нечего: исходник без изменений, кэш не нужен
+        return _restore_source(img, source) if source else img
+
+    source = source or _materialise_source(img)
+    if source is None:
+        return img
+    if fmt == 'KEEP':
+        fmt, ext = None, os.path.splitext(source)[1].lower()
+    else:
+        ext = _TEXTURE_EXT[fmt]
+
+    key = f"{_file_sha256(source)}:{max_size}:{fmt}:{quality}"
+    path = os.path.join(TEXTURE_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ext)
+    if not os.path.isfile(path):
+        work = bpy.data.images.load(source)
+        try:
+            if resize:
+                k = max_size / max(w, h)
+                work.scale(max(1, round(w * k)), max(1, round(h * k)))
+            if fmt is not None:
+                work.file_format = fmt
+            os.makedirs(TEXTURE_CACHE_DIR, exist_ok=True)
+            staging = path + ".part" + ext
+            work.save(filepath=staging, quality=quality)
+            os.replace(staging, path)
+        finally:
+            bpy.data.images.remove(work)
+
+    result = bpy.data.images.load(path, check_existing=True)
+    _copy_image_settings(result, img)
+    result["ar_texture_source"] = source
+    result["ar_texture_source_size"] = [w, h]
+    return result
+
+def process_texture(img, max_size, image_format='KEEP', quality=90, keep_alpha=False):
+    result = processed_texture(img, max_size, image_format, quality, keep_alpha)
+    if result == img:
+        return img
+    name = img.name
+    img.user_remap(result)
+    if img.users == 0:
+        bpy.data.images.remove(img)
+    result.name = name
+    return result
+
+def process_model_textures(root, max_size, image_format='KEEP', quality=90):
+    # Картинки модели уменьшаются до max_size по большей стороне и при желании
+    # перекодируются; готовые версии лежат в AR_CACHE_DIR/textures по хешу исходника
+    images = model_images(root)
+    alpha  = model_alpha_images(root)
+    before = sum(image_memory(img) for img in images)
+    active = bool(max_size) or image_format != 'KEEP'
+    # Уже обработанные картинки пересобираются и при выключенных настройках,
+    # чтобы вернуться к исходникам
+    images = [process_texture(img, max_size, image_format, quality, keep_alpha=img in alpha)
+              if active or "ar_texture_source" in img else img
+              for img in images]
+    after = sum(image_memory(img) for img in images)
+    return {"images": len(images), "before": before, "after": after}
+
+def format_texture_stats(stats):
+    mb = 1024 * 1024
+    return f"текстуры: {stats['before'] / mb:.1f} → {stats['after'] / mb:.1f} МБ"
+
 # ---------------------------
 # Видео-плоскость
 # ---------------------------
 def create_video_plane(video_path, width=27.0, height=20.0, location=(0,0,0)):
-    bpy.ops.mesh.primitive_plane_add(size=1, location=location, rotation=(1.5708,0,0))
-    plane = bpy.context.active_object
-    plane.name = "AR_Background"
+    plane = link_new_object("AR_Background", plane_mesh("AR_Background"), location, (1.5708,0,0))
     plane.scale.x = width/2
     plane.scale.y = height/2
 
-    mat = bpy.data.materials.new(name="Video_Mat")
-    mat.use_nodes=True
-    plane.data.materials.append(mat)
-    nodes = mat.node_tree.nodes
-    links = mat.node_tree.links
-    nodes.clear()
-    output = nodes.new("ShaderNodeOutputMaterial")
-    emission = nodes.new("ShaderNodeEmission")
-    tex = nodes.new("ShaderNodeTexImage")
-
-    img = bpy.data.images.load(bpy.path.abspath(video_path))
-    img.source='MOVIE'
-    tex.image=img
-    tex.image_user.use_auto_refresh=True
-    tex.image_user.frame_start=1
-    links.new(tex.outputs["Color"], emission.inputs["Color"])
-    links.new(emission.outputs["Emission"], output.inputs["Surface"])
+    img = bpy.data.images.load(bpy.path.abspath(video_path), check_existing=True)
+    img.source = 'MOVIE'
+    plane.data.materials.append(
+        node_template_instance('MATERIAL', "Video", "Video_Mat", images={"AR_Video": img}))
 
     if bpy.context.scene.frame_end < img.frame_duration:
         bpy.context.scene.frame_end = img.frame_duration
+    bpy.context.view_layer.update()  # чтобы plane.dimensions были готовы для следующих стадий
     return plane
 
 # ---------------------------
 # Освещение
 # ---------------------------
-def setup_lighting(root):
+def flicker_expression(base, amplitude=1.2, frequency=2.5):
+    # Та же кривая, что раньше запекалась по кадрам; простые выражения
+    # драйверов вычисляются без Python и не требуют автозапуска скриптов
+    return f"{base:.6g}*(0.3+{amplitude:.6g}*abs(sin(frame/10.0*3.14*{frequency:.6g})))"
+
+def setup_lighting(root, flicker='PROCEDURAL', amplitude=1.2, frequency=2.5):
     scene = bpy.context.scene
     scene.frame_start = 1
-    scene.frame_end = 250
+    # frame_end не трогаем: его уже растянула под длину ролика create_video_plane
     positions = [(3,-3,3),(-3,3,2),(0,0,4)]
     energies = [1000,800,600]
     rotations = [(math.radians(60),0,math.radians(45)),(math.radians(60),0,math.radians(-135)),(math.radians(90),0,0)]
     lights=[]
     for i,pos in enumerate(positions):
-        bpy.ops.object.light_add(type='AREA',location=pos)
-        light = bpy.context.active_object
+        light = link_new_object(f"AR_Light_{i+1}", bpy.data.lights.new(f"AR_Light_{i+1}", 'AREA'),
+                                location=pos, rotation=rotations[i])
         light.data.energy=energies[i]
         light.data.size=6.0
-        light.rotation_euler=rotations[i]
         lights.append(light)
     for light in lights:
         base=light.data.energy
-        for f in range(scene.frame_start, scene.frame_end+1):
-            t=f/10.0
-            light.data.energy=base*(0.3+1.2*abs(math.sin(t*3.14*2.5)))
-            light.data.keyframe_insert(data_path="energy", frame=f)
+        if flicker=='PROCEDURAL':
+            driver=light.data.driver_add("energy").driver
+            driver.type='SCRIPTED'
+            driver.expression=flicker_expression(base, amplitude, frequency)
+        elif flicker=='BAKED':
+            for f in range(scene.frame_start, scene.frame_end+1):
+                t=f/10.0
+                light.data.energy=base*(0.3+amplitude*abs(math.sin(t*3.14*frequency)))
+                light.data.keyframe_insert(data_path="energy", frame=f)
+    return lights
 
 # ---------------------------
 # HDRI
 # ---------------------------
 def setup_hdri(hdri_path):
+    # Мир с HDRI — копия шаблона; прежний мир сцены запоминается и
+    # возвращается, когда путь к HDRI очищен
+    scene     = bpy.context.scene
+    world     = scene.world
+    hdri_path = bpy.path.abspath(hdri_path) if hdri_path else ""
     if not hdri_path or not os.path.exists(hdri_path):
+        if world is not None and world.get("ar_template") == "HDRI":
+            scene.world = scene.get("ar_prev_world")
         return
-    world=bpy.context.scene.world
-    world.use_nodes=True
-    nodes=world.node_tree.nodes
-    links=world.node_tree.links
-    env=nodes.new("ShaderNodeTexEnvironment")
-    env.image=bpy.data.images.load(hdri_path)
-    bg=nodes.get("Background")
-    if bg:
-        links.new(env.outputs["Color"], bg.inputs["Color"])
+    if world is not None and world.get("ar_template") != "HDRI":
+        scene["ar_prev_world"] = world
+    image = bpy.data.images.load(hdri_path, check_existing=True)
+    scene.world = node_template_instance('WORLD', "HDRI", "AR_HDRI_World", images={"AR_HDRI": image})
+
+# ---------------------------
+# Пакетная запись ключей
+# ---------------------------
+def _enum_value(rna_type, prop, item):
+    return rna_type.bl_rna.properties[prop].enum_items[item].value
+
+def action_fcurves(idblock):
+    anim = idblock.animation_data
+    try:
+        # Blender 4.4+: F-кривые живут в channelbag слота действия
+        from bpy_extras import anim_utils
+        return anim_utils.action_get_channelbag_for_slot(anim.action, anim.action_slot).fcurves
+    except (ImportError, AttributeError):
+        return anim.action.fcurves
+
+def location_fcurves(obj):
+    fcurves = action_fcurves(obj)
+    return [fcurves.find("location", index=axis) for axis in range(3)]
+
+def write_location_keys(obj, frames, coords, interpolation='BEZIER'):
+    # Пакетная запись анимации location: один keyframe_insert создаёт
+    # action/слот/кривые штатно, дальше точки заполняются через foreach_set
+    frames = np.asarray(frames, dtype=np.float32)
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    n = len(frames)
+    if n == 0:
+        return 0
+    obj.location = coords[0].tolist()
+    obj.keyframe_insert(data_path="location", frame=float(frames[0]))
+
+    interp = np.full(n, _enum_value(bpy.types.Keyframe, "interpolation", interpolation), dtype=np.int32)
+    handle = np.full(n, _enum_value(bpy.types.Keyframe, "handle_left_type", 'AUTO_CLAMPED'), dtype=np.int32)
+    co = np.empty(n * 2, dtype=np.float32)
+    co[0::2] = frames
+    for axis, fc in enumerate(location_fcurves(obj)):
+        points = fc.keyframe_points
+        points.clear()
+        points.add(n)
+        co[1::2] = coords[:, axis]
+        points.foreach_set("co", co)
+        points.foreach_set("interpolation", interp)
+        points.foreach_set("handle_left_type", handle)
+        points.foreach_set("handle_right_type", handle)
+        fc.update()
+    return n * 3
+
+def simplify_path(frames, coords, tolerance):
+    # Рамер—Дуглас—Пекер по времени: оставляем кадры, без которых линейная
+    # интерполяция между соседними ключами уходит от выборки дальше tolerance
+    n = len(coords)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        inner = np.arange(a + 1, b)
+        w = ((frames[inner] - frames[a]) / (frames[b] - frames[a]))[:, None]
+        err = np.linalg.norm(coords[inner] - (coords[a] + (coords[b] - coords[a]) * w), axis=1)
+        k = int(np.argmax(err))
+        if err[k] > tolerance:
+            m = a + 1 + k
+            keep[m] = True
+            stack += [(a, m), (m, b)]
+    return np.flatnonzero(keep)
+
+def _bezier(p0, p1, p2, p3, t):
+    u = 1.0 - t
+    return u * u * u * p0 + 3.0 * u * u * t * p1 + 3.0 * u * t * t * p2 + t * t * t * p3
+
+def evaluate_bezier_fcurves(fcurves, frames, iterations=40):
+    # То же, что fc.evaluate(f) для Bezier-ключей, но сразу на всех кадрах:
+    # точки и ручки читаются через foreach_get, параметр t участка находится
+    # бисекцией по x(t) = кадр (как и в Blender, ручки сначала укорачиваются,
+    # чтобы x(t) на участке была монотонной)
+    frames = np.asarray(frames, dtype=np.float64)
+    fitted = np.empty((len(frames), len(fcurves)))
+    for axis, fc in enumerate(fcurves):
+        points = fc.keyframe_points
+        n = len(points)
+        arrays = []
+        for prop in ("co", "handle_left", "handle_right"):
+            buf = np.empty(n * 2, dtype=np.float32)
+            points.foreach_get(prop, buf)
+            arrays.append(buf.reshape(n, 2).astype(np.float64))
+        co, left, right = arrays
+        if n == 1:
+            fitted[:, axis] = co[0, 1]
+            continue
+        seg = np.clip(np.searchsorted(co[:, 0], frames, side='right') - 1, 0, n - 2)
+        p0, p1, p2, p3 = co[seg], right[seg], left[seg + 1], co[seg + 1]
+        span  = p3[:, 0] - p0[:, 0]
+        reach = (p1[:, 0] - p0[:, 0]) + (p3[:, 0] - p2[:, 0])
+        fac = np.where(reach > span, span / np.where(reach > 0, reach, 1.0), 1.0)[:, None]
+        p1 = p0 + (p1 - p0) * fac
+        p2 = p3 - (p3 - p2) * fac
+        x = np.clip(frames, p0[:, 0], p3[:, 0])
+        lo, hi = np.zeros(len(frames)), np.ones(len(frames))
+        for _ in range(iterations):
+            mid = (lo + hi) * 0.5
+            before = _bezier(p0[:, 0], p1[:, 0], p2[:, 0], p3[:, 0], mid) < x
+            lo = np.where(before, mid, lo)
+            hi = np.where(before, hi, mid)
+        fitted[:, axis] = _bezier(p0[:, 1], p1[:, 1], p2[:, 1], p3[:, 1], (lo + hi) * 0.5)
+    return fitted
+
+def write_sparse_location_keys(obj, frames, coords, tolerance, max_passes=20):
+    # Bezier-ключи с точностью до tolerance: после записи кривая вычисляется
+    # на всех кадрах выборки, и в каждый участок с превышением добавляется худший кадр.
+    # Статистика всегда относится к последней записанной кривой.
+    frames = np.asarray(frames, dtype=np.float64)
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    keys = simplify_path(frames, coords, tolerance)
+    for attempt in range(max_passes):
+        write_location_keys(obj, frames[keys], coords[keys])
+        fitted = evaluate_bezier_fcurves(location_fcurves(obj), frames)
+        deviation = np.linalg.norm(fitted - coords, axis=1)
+        bad = np.flatnonzero(deviation > tolerance)
+        if not len(bad) or attempt == max_passes - 1:
+            break
+        runs = np.split(bad, np.flatnonzero(np.diff(bad) > 1) + 1)
+        keys = np.union1d(keys, [run[np.argmax(deviation[run])] for run in runs])
+    return {"keys": len(keys), "samples": len(frames), "max_deviation": float(deviation.max())}
+
+def format_key_stats(stats):
+    ratio = stats["samples"] / max(1, stats["keys"])
+    return (f"ключей {stats['keys']} из {stats['samples']} (×{ratio:.1f}), "
+            f"макс. отклонение {stats['max_deviation']:.4f}")
+
+# ---------------------------
+# Траектории камеры
+# ---------------------------
+# Каждая траектория — функция от массива t в [0, 1] (доля пути), возвращающая
+# массив позиций (N, 3). Все кадры считаются одним вызовом NumPy, без bpy,
+# так что пути можно генерировать и в пакетных задачах.
+CAMERA_PATHS = {}
+
+def register_camera_path(name, label=None, description=""):
+    def decorator(fn):
+        CAMERA_PATHS[name] = {"fn": fn, "label": label or name, "description": description}
+        return fn
+    return decorator
+
+def camera_path_items():
+    return [(name, p["label"], p["description"]) for name, p in CAMERA_PATHS.items()]
+
+def sample_camera_path(name, frames, constant_speed=False, first=0, oversample=8, **params):
+    # Кадр i (считая с нуля) соответствует t = (i + first) / frames.
+    # constant_speed — перепараметризация по длине дуги: равные отрезки пути за кадр
+    fn = CAMERA_PATHS[name]["fn"]
+    t = (np.arange(frames) + first) / frames
+    if not constant_speed or frames < 2:
+        return fn(t, **params)
+    dense_t = np.linspace(0.0, 1.0, frames * oversample + 1)
+    dense   = fn(dense_t, **params)
+    arc = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(dense, axis=0), axis=1))))
+    if arc[-1] <= 0.0:
+        return fn(t, **params)
+    return fn(np.interp(arc[-1] * t, arc, dense_t), **params)
+
+@register_camera_path('FIT_ORBIT', "Облёт с паузой", "Первые 10% статично, затем облёт вокруг модели")
+def _path_fit_orbit(t, center, distance, base_z):
+    angle = np.where(t < 0.1, 0.0, 2 * np.pi * (t - 0.1) / 0.9)
+    return np.stack((
+        center[0] + distance * 0.15 * np.sin(angle),
+        center[1] - distance * np.cos(angle),
+        np.full_like(angle, base_z),
+    ), axis=1)
 
 # ---------------------------
 # Камера на модели
 # ---------------------------
-def add_camera_fit_scene(root, plane):
+def add_camera_fit_scene(root, plane, tolerance=None):
     import math
     from mathutils import Vector
 
@@ -247,9 +1863,8 @@ def add_camera_fit_scene(root, plane):
     total_frames = scene.frame_end
 
     # Берём границы модели
-    if root.children:
-        model_geom = root.children[0]
-        mb = mesh_world_bounds(model_geom)
+    mb = model_bounds(root)
+    if mb:
         center = mb[2]  # центр модели
         extents = mb[3]  # размеры модели
     else:
@@ -275,9 +1890,8 @@ def add_camera_fit_scene(root, plane):
 
     # Камера строго параллельна модели, на уровне центра
     base_z = center.z + model_height / 2
-    bpy.ops.object.camera_add(location=(center.x, center.y - distance, base_z))
-    cam = bpy.context.active_object
-    cam.name = "AR_Camera"
+    cam = link_new_object("AR_Camera", bpy.data.cameras.new("AR_Camera"),
+                          location=(center.x, center.y - distance, base_z))
     cam.data.lens = cam_lens
     cam.data.clip_start = 0.1
 
@@ -288,67 +1902,58 @@ def add_camera_fit_scene(root, plane):
     track.up_axis = 'UP_Y'
 
     # Камера остаётся на месте первые кадры, потом плавно вращается
-    for f in range(1, total_frames + 1):
-        t = f / total_frames
-        if t < 0.1:  # первые 10% времени статично
-            x = center.x
-            y = center.y - distance
-        else:  # плавное вращение вокруг модели
-            angle = 2 * math.pi * (t - 0.1) / 0.9
-            x = center.x + distance * 0.15 * math.sin(angle)
-            y = center.y - distance * math.cos(angle)
-        z = base_z
-        cam.location = Vector((x, y, z))
-        cam.keyframe_insert(data_path="location", frame=f)
+    samples = sample_camera_path('FIT_ORBIT', total_frames, first=1,
+                                 center=np.array(center), distance=distance, base_z=base_z)
+    if tolerance:
+        stats = write_sparse_location_keys(cam, range(1, total_frames + 1), samples, tolerance)
+    else:
+        write_location_keys(cam, range(1, total_frames + 1), samples)
+        stats = {"keys": total_frames, "samples": total_frames, "max_deviation": 0.0}
 
     scene.camera = cam
-    return cam
+    return cam, stats
 
 
 # ---------------------------
 # Купол
 # ---------------------------
-def add_foggy_dome(root, plane):
-    if root.children:
-        geom=root.children[0]
-        mb=mesh_world_bounds(geom)
-        center=mb[2] if mb else root.location
-    else:
-        center=root.location
+DOME_RESOLUTIONS={
+    'LOW':    (32, 16),
+    'MEDIUM': (64, 32),
+    'HIGH':   (128, 64),
+}
+
+def get_dome_mesh(resolution='MEDIUM'):
+    # Единичная сфера с нормалями внутрь строится через bmesh один раз на уровень
+    # и переживает пересборки (fake user); радиус задаётся масштабом объекта
+    name=f"AR_Fog_Dome_Mesh_{resolution}"
+    mesh=bpy.data.meshes.get(name)
+    if mesh is None:
+        segments, rings=DOME_RESOLUTIONS[resolution]
+        bm=bmesh.new()
+        try:
+            bmesh.ops.create_uvsphere(bm, u_segments=segments, v_segments=rings, radius=1.0)
+            bmesh.ops.reverse_faces(bm, faces=bm.faces[:])
+            mesh=bpy.data.meshes.new(name)
+            bm.to_mesh(mesh)
+        finally:
+            bm.free()
+        mesh.use_fake_user=True
+    return mesh
+
+def add_foggy_dome(root, plane, resolution='MEDIUM'):
+    mb=model_bounds(root)
+    center=mb[2] if mb else root.location
     radius=max(plane.dimensions.x, plane.dimensions.y)*1.5
-    bpy.ops.mesh.primitive_uv_sphere_add(segments=64, ring_count=32, radius=radius, location=center)
-    dome=bpy.context.active_object
-    dome.name="AR_Fog_Dome"
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='SELECT')
-    bpy.ops.mesh.flip_normals()
-    bpy.ops.object.mode_set(mode='OBJECT')
-    mat=bpy.data.materials.new(name="Fog_Dome_Mat")
-    mat.use_nodes=True
-    nodes=mat.node_tree.nodes
-    links=mat.node_tree.links
-    nodes.clear()
-    output=nodes.new("ShaderNodeOutputMaterial")
-    emission=nodes.new("ShaderNodeEmission")
-    gradient=nodes.new("ShaderNodeTexGradient")
-    coord=nodes.new("ShaderNodeTexCoord")
-    ramp=nodes.new("ShaderNodeValToRGB")
-    transparent=nodes.new("ShaderNodeBsdfTransparent")
-    mix=nodes.new("ShaderNodeMixShader")
-    gradient.gradient_type='SPHERICAL'
-    ramp.color_ramp.elements[0].position=0.1
-    ramp.color_ramp.elements[0].color=(0.8,0.1,1.0,1.0)
-    ramp.color_ramp.elements[1].position=1.0
-    ramp.color_ramp.elements[1].color=(0.0,0.0,0.0,0.0)
-    links.new(coord.outputs["Object"], gradient.inputs["Vector"])
-    links.new(gradient.outputs["Fac"], ramp.inputs["Fac"])
-    links.new(ramp.outputs["Color"], emission.inputs["Color"])
-    emission.inputs["Strength"].default_value=1.5
-    links.new(emission.outputs["Emission"], mix.inputs[2])
-    links.new(transparent.outputs["BSDF"], mix.inputs[1])
-    mix.inputs["Fac"].default_value=0.5
-    links.new(mix.outputs["Shader"], output.inputs["Surface"])
-    dome.data.materials.append(mat)
+    mesh=get_dome_mesh(resolution)
+    mat=node_template_instance('MATERIAL', "FogDome", "Fog_Dome_Mat")
+    if mesh.materials:
+        mesh.materials[0]=mat
+    else:
+        mesh.materials.append(mat)
+
+    dome=link_new_object("AR_Fog_Dome", mesh, location=center)
+    dome.scale=(radius,)*3
     dome.display_type='SOLID'
     dome.show_in_front=True
     return dome
@@ -359,14 +1964,11 @@ def add_foggy_dome(root, plane):
 def add_trailing_tail(root, segments=30, length_factor=0.5):
     if not root.children:
         return None
-    geom = root.children[0]
 
-    bpy.ops.curve.primitive_bezier_curve_add()
-    curve = bpy.context.active_object
-    curve.name = "AR_Tail"
+    curve = link_new_object("AR_Tail", bpy.data.curves.new("AR_Tail", 'CURVE'))
     curve.data.dimensions = '3D'
 
-    spline = curve.data.splines[0]
+    spline = curve.data.splines.new('BEZIER')
 
     # Устанавливаем нужное количество точек
     spline.bezier_points.add(segments - 1)  # первая точка уже есть
@@ -380,40 +1982,609 @@ def add_trailing_tail(root, segments=30, length_factor=0.5):
     curve.data.bevel_resolution = 3
     return curve
 
+# ---------------------------
+# Профилирование сборки
+# ---------------------------
+PROFILE_LOG = os.path.join(AR_CACHE_DIR, "build_profile.jsonl")
+
+DOWNLOAD_PHASES = {"Локальная библиотека": "library", "Поиск модели": "search",
+                   "Скачивание": "download", "Распаковка": "unzip"}
+
+def _windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+                "PagefileUsage", "PeakPagefileUsage")]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+def peak_rss_mb():
+    # Пик резидентной памяти процесса Blender за всё время его жизни:
+    # ru_maxrss в КБ на Linux, в байтах на macOS
+    try:
+        import resource
+    except ImportError:
+        try:
+            counters = _windows_memory_counters()
+        except (AttributeError, OSError):
+            return None
+        return counters.PeakWorkingSetSize / (1024 * 1024) if counters else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def current_rss_mb():
+    # Резидентная память процесса сейчас: /proc/self/statm на Linux,
+    # WorkingSetSize на Windows; на macOS дешёвого способа нет — None
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == "win32":
+        try:
+            counters = _windows_memory_counters()
+        except (AttributeError, OSError):
+            return None
+        return counters.WorkingSetSize / (1024 * 1024) if counters else None
+    return None
+
+def memory_snapshot():
+    return current_rss_mb(), peak_rss_mb()
+
+def _memory_delta(before, after):
+    # Рост RSS за стадию и насколько стадия подняла пик процесса (0 — пик
+    # был достигнут раньше). Память общая на процесс: стадии из рабочего
+    # потока загрузки пересекаются по времени с соседними.
+    (rss_start, peak_start), (rss_end, peak_end) = before, after
+    return {
+        "rss_mb": None if rss_end is None else round(rss_end, 1),
+        "rss_delta_mb": None if None in (rss_start, rss_end) else round(rss_end - rss_start, 1),
+        "peak_delta_mb": None if None in (peak_start, peak_end) else round(peak_end - peak_start, 1),
+    }
+
+class BuildProfiler:
+    # Замеры одной сборки: по записи на стадию — время, RSS в конце стадии,
+    # его рост за стадию, рост пика процесса и счётчики (вершины, ключи, байты).
+    # Записи добавляются и из рабочего потока загрузки.
+    def __init__(self, label=""):
+        self.label   = label
+        self.started = time.perf_counter()
+        self.records = []
+        self._lock   = threading.Lock()
+
+    def add(self, name, start, seconds, counts=None, memory=None):
+        # memory — memory_snapshot() на начало стадии
+        record = {
+            "stage": name,
+            "start": round(start - self.started, 4),
+            "seconds": round(seconds, 4),
+            **_memory_delta(memory or (None, None), memory_snapshot()),
+            "counts": counts or {},
+        }
+        with self._lock:
+            self.records.append(record)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        counts = {}
+        memory = memory_snapshot()
+        start  = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(name, start, time.perf_counter() - start, counts, memory)
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+class DownloadTrace:
+    # progress(stage, done, total) для download_model_from_sketchfab: делит загрузку
+    # на фазы (поиск, скачивание, распаковка) и считает скачанные байты
+    def __init__(self, profiler, inner=None):
+        self.profiler = profiler
+        self.inner    = inner
+        self.phase    = None
+        self.start    = 0.0
+        self.memory   = None
+        self.bytes    = 0
+
+    def __call__(self, stage, done=0, total=0):
+        if stage != self.phase:
+            self.finish()
+            self.phase  = stage
+            self.memory = memory_snapshot()
+            self.start  = time.perf_counter()
+        if stage == "Скачивание":
+            self.bytes = done
+        if self.inner is not None:
+            self.inner(stage, done, total)
+
+    def finish(self):
+        if self.phase is not None:
+            counts = {"bytes": self.bytes} if self.phase == "Скачивание" else {}
+            self.profiler.add(DOWNLOAD_PHASES.get(self.phase, self.phase), self.start,
+                              time.perf_counter() - self.start, counts, self.memory)
+            self.phase = None
+
+def profiled_download(profiler, prompt, progress=None, **kwargs):
+    # resolve_model с записью фаз в профиль; годится для рабочего потока
+    trace = DownloadTrace(profiler, progress)
+    with profiler.stage("fetch") as counts:
+        try:
+            return resolve_model(prompt, progress=trace, **kwargs)
+        finally:
+            trace.finish()
+            counts["bytes"] = trace.bytes
+
+def count_keyframes(ids):
+    total = 0
+    for idblock in ids:
+        anim = idblock.animation_data
+        if anim is None or anim.action is None:
+            continue
+        total += sum(len(fc.keyframe_points) for fc in action_fcurves(idblock))
+    return total
+
+def save_profile(scene, profiler, log_path=None):
+    # Последний прогон — в сцену (для панели), история — строкой JSON в лог
+    entry = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "addon": bl_info["name"],
+        "version": list(bl_info["version"]),
+        "blender": bpy.app.version_string,
+        "label": profiler.label,
+        "total_seconds": round(profiler.total_seconds(), 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": sorted(profiler.records, key=lambda r: r["start"]),
+    }
+    scene["ar_last_profile"] = json.dumps(entry, ensure_ascii=False)
+    log_path = log_path or PROFILE_LOG
+    try:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"Не удалось записать профиль сборки: {e}")
+    return entry
+
+def draw_profile(layout, scene):
+    data = scene.get("ar_last_profile")
+    if not data:
+        return
+    entry = json.loads(data)
+    peak = entry.get("peak_rss_mb")
+    text = f"Последняя сборка: {entry['total_seconds']:.2f} с" + (f" · пик {peak:.0f} МБ" if peak else "")
+    box = layout.box()
+    box.prop(scene, "ar_show_profile", text=text, emboss=False,
+             icon='TRIA_DOWN' if scene.ar_show_profile else 'TRIA_RIGHT')
+    if not scene.ar_show_profile:
+        return
+    col = box.column(align=True)
+    for record in entry["stages"]:
+        row = col.row()
+        row.label(text=record["stage"])
+        row.label(text=f"{record['seconds']:.3f} с")
+        delta = record.get("rss_delta_mb")
+        row.label(text=f"{delta:+.0f} МБ" if delta is not None else "")
+        row.label(text=" ".join(f"{k}={v}" for k, v in record["counts"].items()))
+
+# ---------------------------
+# Граф стадий сборки
+# ---------------------------
+# Сборка разбита на стадии с явными зависимостями. Для каждой стадии
+# хранится хеш её входов (в scene["ar_stage_hashes"]); при повторной сборке
+# перезапускаются только стадии с изменившимися входами и всё, что от них
+# зависит, а объекты чистых стадий остаются в сцене как есть.
+STAGE_TAG = "ar_stage"
+
+class BuildStage:
+    def __init__(self, name, run, inputs=None, deps=(), restore=None):
+        self.name    = name
+        self.run     = run                                  # run(scene, state)
+        self.inputs  = inputs or (lambda scene, state: None)
+        self.deps    = tuple(deps)
+        self.restore = restore or (lambda state: True)      # False — результатов в сцене нет
+
+def file_fingerprint(path):
+    path = bpy.path.abspath(path) if path else ""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [path, None, None]
+    return [path, st.st_mtime_ns, st.st_size]
+
+def stage_hash(stage, scene, state):
+    payload = json.dumps([stage.name, stage.inputs(scene, state)], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _load_stage_hashes(scene):
+    try:
+        return json.loads(scene.get("ar_stage_hashes", "{}"))
+    except ValueError:
+        return {}
+
+def _save_stage_hashes(scene, hashes):
+    scene["ar_stage_hashes"] = json.dumps(hashes)
+
+def remove_stage_objects(stage_name):
+    objects = [o for o in bpy.data.objects if o.get(STAGE_TAG) == stage_name]
+    data = {o.data for o in objects if o.data is not None}
+    materials = {m for d in data for m in getattr(d, "materials", ()) if m is not None}
+    images = {n.image for m in materials if m.node_tree is not None
+              for n in m.node_tree.nodes if n.type == 'TEX_IMAGE' and n.image is not None}
+    bpy.data.batch_remove(objects)
+    bpy.data.batch_remove([d for d in data if d.users == 0])
+    bpy.data.batch_remove([m for m in materials if m.users == 0])
+    # Картинки (видео фона, текстуры модели) иначе копились бы при каждом
+    # перезапуске стадии: у удалённого материала они остаются без пользователей
+    bpy.data.batch_remove([i for i in images if i.users == 0])
+
+def run_build_stages(scene, stages, state, force=False, profiler=None):
+    hashes = _load_stage_hashes(scene)
+    if force or not hashes:
+        clear_scene()
+        hashes = {}
+    dirty = set()
+    for stage in stages:
+        digest = stage_hash(stage, scene, state)
+        if (hashes.get(stage.name) == digest
+                and not dirty.intersection(stage.deps)
+                and stage.restore(state)):
+            continue
+        dirty.add(stage.name)
+        remove_stage_objects(stage.name)
+        # Хеш снимается до запуска: если стадия упадёт, следующая сборка её повторит
+        hashes.pop(stage.name, None)
+        _save_stage_hashes(scene, hashes)
+
+        before = {o.session_uid for o in bpy.data.objects}
+        with profiler.stage(stage.name) if profiler else contextlib.nullcontext({}) as counts:
+            # Стадия может дописать свои счётчики в state["counts"]
+            state["counts"] = counts
+            stage.run(scene, state)
+            created = [o for o in bpy.data.objects if o.session_uid not in before]
+            for obj in created:
+                obj[STAGE_TAG] = stage.name
+            vertices = sum(len(o.data.vertices) for o in created if o.type == 'MESH')
+            keyframes = count_keyframes(created + [o.data for o in created if o.data is not None])
+            if vertices:
+                counts.setdefault("vertices", vertices)
+            if keyframes:
+                counts.setdefault("keyframes", keyframes)
+
+        hashes[stage.name] = digest
+        _save_stage_hashes(scene, hashes)
+    state.pop("counts", None)
+    state["rebuilt"] = [s.name for s in stages if s.name in dirty]
+    return state
+
+def _restore_object(state, key, name):
+    obj=bpy.data.objects.get(name)
+    state[key]=obj
+    return obj is not None
+
+def _has_stage_objects(stage_name):
+    return any(o.get(STAGE_TAG)==stage_name for o in bpy.data.objects)
+
+def _stage_plane(scene, state):
+    state["plane"]=create_video_plane(scene.ar_video_path)
+
+def _stage_model(scene, state):
+    state["root"]=import_model_geometry(state["model_path"], mode=scene.ar_import_mode,
+                                        stats=state["counts"])
+
+def _stage_lod(scene, state):
+    state["lod"]=apply_lod(state["root"], scene.ar_lod_budget, enabled=scene.ar_lod_enabled)
+    state["counts"].update(triangles_before=state["lod"]["before"], triangles_after=state["lod"]["after"])
+
+def _stage_textures(scene, state):
+    stats=process_model_textures(state["root"], scene.ar_texture_max_size, scene.ar_texture_format,
+                                 scene.ar_texture_quality)
+    state["textures"]=stats
+    state["counts"].update(images=stats["images"], bytes_before=int(stats["before"]), bytes_after=int(stats["after"]))
+    scene["ar_texture_memory"]=[float(stats["before"]), float(stats["after"])]
+
+def _stage_placement(scene, state):
+    place_model(state["root"], state["plane"], rotation=tuple(scene.ar_model_rot))
+
+def _stage_lighting(scene, state):
+    setup_lighting(state["root"], flicker=scene.ar_light_flicker,
+                   amplitude=scene.ar_light_flicker_amp, frequency=scene.ar_light_flicker_freq)
+
+def _stage_hdri(scene, state):
+    setup_hdri(scene.ar_hdri_path)
+
+def _stage_camera(scene, state):
+    _, state["camera_keys"]=add_camera_fit_scene(state["root"], state["plane"], tolerance=key_tolerance(scene))
+
+def _stage_dome(scene, state):
+    add_foggy_dome(state["root"], state["plane"], resolution=scene.ar_dome_resolution)
+
+def _stage_tail(scene, state):
+    add_trailing_tail(state["root"])
+
+BUILD_STAGES=[
+    BuildStage("plane", _stage_plane,
+               inputs=lambda scene, state: file_fingerprint(scene.ar_video_path),
+               restore=lambda state: _restore_object(state, "plane", "AR_Background")),
+    BuildStage("model", _stage_model,
+               inputs=lambda scene, state: [state["model_path"], scene.ar_import_mode],
+               restore=lambda state: _restore_object(state, "root", "AR_Model")),
+    BuildStage("lod", _stage_lod, deps=("model",),
+               inputs=lambda scene, state: [scene.ar_lod_enabled, scene.ar_lod_budget]),
+    BuildStage("textures", _stage_textures, deps=("model",),
+               inputs=lambda scene, state: [scene.ar_texture_max_size, scene.ar_texture_format,
+                                            scene.ar_texture_quality]),
+    BuildStage("placement", _stage_placement, deps=("plane", "model"),
+               inputs=lambda scene, state: list(scene.ar_model_rot)),
+    BuildStage("lighting", _stage_lighting, deps=("plane",),
+               inputs=lambda scene, state: [scene.ar_light_flicker, scene.ar_light_flicker_amp,
+                                            scene.ar_light_flicker_freq, scene.frame_end],
+               restore=lambda state: _has_stage_objects("lighting")),
+    BuildStage("hdri", _stage_hdri,
+               inputs=lambda scene, state: file_fingerprint(scene.ar_hdri_path)),
+    BuildStage("camera", _stage_camera, deps=("plane", "placement"),
+               inputs=lambda scene, state: [key_tolerance(scene), scene.frame_end],
+               restore=lambda state: bpy.data.objects.get("AR_Camera") is not None),
+    BuildStage("dome", _stage_dome, deps=("placement",),
+               inputs=lambda scene, state: scene.ar_dome_resolution,
+               restore=lambda state: bpy.data.objects.get("AR_Fog_Dome") is not None),
+    BuildStage("tail", _stage_tail, deps=("placement",),
+               restore=lambda state: bpy.data.objects.get("AR_Tail") is not None),
+]
+
+# ---------------------------
+# Фоновая загрузка
+# ---------------------------
+class BuildJob:
+    # Состояние фоновой загрузки; рабочий поток пишет, панель и таймер читают
+    def __init__(self, prompt):
+        self.prompt = prompt
+        self.stage = "Ожидание"
+        self.done = 0
+        self.total = 0
+        self.started = time.monotonic()
+        self.stage_started = self.started
+        self.cancel_event = threading.Event()
+        self.profiler = BuildProfiler(prompt)
+        self.future = None
+
+    def progress(self, stage, done=0, total=0):
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_started = time.monotonic()
+        self.done = done
+        self.total = total
+
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    def eta(self):
+        elapsed = time.monotonic() - self.stage_started
+        if not self.total or not self.done or elapsed <= 0:
+            return None
+        return (self.total - self.done) / (self.done / elapsed)
+
+_build_executor = None
+_active_job = None
+
+def get_build_executor():
+    global _build_executor
+    if _build_executor is None:
+        _build_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ar_build")
+    return _build_executor
+
+def shutdown_build_executor():
+    global _build_executor, _active_job
+    if _active_job is not None:
+        _active_job.cancel_event.set()
+        _active_job = None
+    if _build_executor is not None:
+        _build_executor.shutdown(wait=False, cancel_futures=True)
+        _build_executor = None
+
+def redraw_panels(context):
+    if context.screen is None:
+        return
+    for area in context.screen.areas:
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
+
 # ---------------------------
 # Основной оператор
 # ---------------------------
+def build_scene_stages(context, model_path, force=False, profiler=None):
+    # Всё, что трогает bpy, — только из главного потока
+    return run_build_stages(context.scene, BUILD_STAGES, {"model_path": model_path},
+                            force=force, profiler=profiler)
+
+def key_tolerance(scene):
+    return scene.ar_camera_key_tolerance if scene.ar_camera_sparse_keys else None
+
+def build_report(scene, message, result):
+    rebuilt=result.get("rebuilt")
+    if rebuilt is not None:
+        message+=" · стадии: "+(", ".join(rebuilt) if rebuilt else "без изменений")
+    if scene.ar_camera_sparse_keys and result.get("camera_keys"):
+        message+=" · "+format_key_stats(result["camera_keys"])
+    if scene.ar_lod_enabled and result.get("lod"):
+        message+=" · "+format_lod_stats(result["lod"])
+    if result.get("textures"):
+        message+=" · "+format_texture_stats(result["textures"])
+    return message
+
+def video_is_valid(video):
+    return bool(video) and os.path.isfile(bpy.path.abspath(video))
+
 class AR_OT_BuildScene(bpy.types.Operator):
     bl_idname="ar.build_scene"
     bl_label="Создать AR сцену"
     bl_options={'REGISTER','UNDO'}
 
+    full_rebuild: bpy.props.BoolProperty(
+        name="Пересобрать полностью",
+        description="Очистить сцену и выполнить все стадии заново",
+        default=False
+    )
+
     def execute(self, context):
-        video=context.scene.ar_video_path
-        hdri=context.scene.ar_hdri_path
-        prompt=context.scene.ar_prompt
-        rot=tuple(context.scene.ar_model_rot)
+        if not video_is_valid(context.scene.ar_video_path):
+            self.report({'ERROR'},"Выбери корректный видеофайл!")
+            return {'CANCELLED'}
+
+        profiler=BuildProfiler(context.scene.ar_prompt)
+        model_path=profiled_download(profiler, context.scene.ar_prompt, **resolve_options(context.scene))
+        result=build_scene_stages(context, model_path, force=self.full_rebuild, profiler=profiler)
+        save_profile(context.scene, profiler)
 
-        if not video or not os.path.isfile(bpy.path.abspath(video)):
+        self.report({'INFO'},build_report(context.scene,"AR сцена создана!",result))
+        return {'FINISHED'}
+
+class AR_OT_BuildSceneAsync(bpy.types.Operator):
+    bl_idname="ar.build_scene_async"
+    bl_label="Создать AR сцену (в фоне)"
+    bl_description="Скачивает и распаковывает модель в фоне, не блокируя интерфейс"
+    bl_options={'REGISTER','UNDO'}
+
+    full_rebuild: bpy.props.BoolProperty(
+        name="Пересобрать полностью",
+        description="Очистить сцену и выполнить все стадии заново",
+        default=False
+    )
+
+    _timer=None
+
+    def invoke(self, context, event):
+        global _active_job
+        if _active_job is not None:
+            self.report({'WARNING'},"Сборка уже выполняется")
+            return {'CANCELLED'}
+        if not video_is_valid(context.scene.ar_video_path):
             self.report({'ERROR'},"Выбери корректный видеофайл!")
             return {'CANCELLED'}
 
-        clear_scene()
-        plane=create_video_plane(video)
-        model_path=download_model_from_sketchfab(prompt)
-        root=import_model(model_path, plane, rotation=rot)
-        setup_lighting(root)
-        setup_hdri(hdri)
-        cam = add_camera_fit_scene(root, plane)
-        add_foggy_dome(root, plane)
-        add_trailing_tail(root)
-
-        self.report({'INFO'},"AR сцена создана!")
+        job=BuildJob(context.scene.ar_prompt)
+        job.future=get_build_executor().submit(
+            profiled_download, job.profiler, job.prompt,
+            progress=job.progress, cancel=job.cancel_event, **resolve_options(context.scene))
+        _active_job=job
+
+        wm=context.window_manager
+        self._timer=wm.event_timer_add(0.2, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, context):
+        return self.invoke(context, None)
+
+    def modal(self, context, event):
+        global _active_job
+        job=_active_job
+        if job is None:
+            # unregister() или отмена извне
+            self._remove_timer(context)
+            return {'CANCELLED'}
+        if event.type=='ESC' and event.value=='PRESS':
+            job.cancel_event.set()
+        if event.type!='TIMER':
+            return {'PASS_THROUGH'}
+
+        redraw_panels(context)
+        if not job.future.done():
+            return {'PASS_THROUGH'}
+
+        self._remove_timer(context)
+        _active_job=None
+        try:
+            model_path=job.future.result()
+        except (BuildCancelled, concurrent.futures.CancelledError):
+            self.report({'WARNING'},"Сборка отменена")
+            return {'CANCELLED'}
+        except Exception as e:
+            self.report({'ERROR'},f"Ошибка загрузки модели: {e}")
+            return {'CANCELLED'}
+        if job.cancel_event.is_set():
+            self.report({'WARNING'},"Сборка отменена")
+            return {'CANCELLED'}
+
+        try:
+            result=build_scene_stages(context, model_path, force=self.full_rebuild, profiler=job.profiler)
+        except Exception as e:
+            # Модальный оператор не должен падать с трассировкой: задача и таймер
+            # уже сняты, профиль сохраняется до упавшей стадии
+            save_profile(context.scene, job.profiler)
+            redraw_panels(context)
+            self.report({'ERROR'},f"Ошибка сборки сцены: {e}")
+            return {'CANCELLED'}
+        save_profile(context.scene, job.profiler)
+        redraw_panels(context)
+        self.report({'INFO'},build_report(context.scene,f"AR сцена создана за {time.monotonic()-job.started:.1f} с",result))
+        return {'FINISHED'}
+
+    def _remove_timer(self, context):
+        if self._timer is not None:
+            context.window_manager.event_timer_remove(self._timer)
+            self._timer=None
+
+class AR_OT_ScanLibrary(bpy.types.Operator):
+    bl_idname="ar.scan_library"
+    bl_label="Обновить библиотеку"
+    bl_description="Проиндексировать .glb/.gltf в каталогах библиотеки (разбираются только новые и изменённые файлы)"
+    bl_options={'REGISTER'}
+
+    def execute(self, context):
+        directories = library_directories(context.scene)
+        if not directories:
+            self.report({'WARNING'}, "Не заданы каталоги библиотеки")
+            return {'CANCELLED'}
+        try:
+            stats = get_model_library().scan(directories)
+        except sqlite3.Error as e:
+            self.report({'ERROR'}, f"Ошибка индекса библиотеки: {e}")
+            return {'CANCELLED'}
+        message = (f"Библиотека: добавлено {stats['added']}, обновлено {stats['updated']}, "
+                   f"удалено {stats['removed']}, без изменений {stats['unchanged']}")
+        if stats["failed"]:
+            message += f", не разобрано {stats['failed']}"
+        self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+class AR_OT_CancelBuild(bpy.types.Operator):
+    bl_idname="ar.cancel_build"
+    bl_label="Отменить сборку"
+    bl_options={'REGISTER'}
+
+    def execute(self, context):
+        if _active_job is not None:
+            _active_job.cancel_event.set()
         return {'FINISHED'}
 
 # ---------------------------
 # Панель
 # ---------------------------
+def draw_build_progress(layout, job):
+    box=layout.box()
+    if job.total:
+        eta=job.eta()
+        text=f"{job.stage}: {job.done/1e6:.1f} / {job.total/1e6:.1f} МБ"
+        if eta is not None:
+            text+=f" · ещё ~{eta:.0f} с"
+        box.progress(factor=job.fraction(), type='BAR', text=text)
+    else:
+        box.label(text=f"{job.stage}…", icon='TIME')
+    box.operator(AR_OT_CancelBuild.bl_idname, icon='CANCEL')
+
 class AR_PT_ScenePanel(bpy.types.Panel):
     bl_label="AR Scene Builder"
     bl_idname="AR_PT_scene_builder"
@@ -426,23 +2597,68 @@ class AR_PT_ScenePanel(bpy.types.Panel):
         layout.prop(context.scene,"ar_video_path")
         layout.prop(context.scene,"ar_hdri_path")
         layout.prop(context.scene,"ar_prompt")
+        row=layout.row(align=True)
+        row.prop(context.scene,"ar_library_mode", text="")
+        row.operator(AR_OT_ScanLibrary.bl_idname, text="", icon='FILE_REFRESH')
+        if context.scene.ar_library_mode!='ONLINE':
+            layout.prop(context.scene,"ar_library_dirs")
         layout.prop(context.scene,"ar_model_rot")
-        layout.operator(AR_OT_BuildScene.bl_idname)
+        layout.prop(context.scene,"ar_cache_limit_mb")
+        layout.prop(context.scene,"ar_import_mode")
+        row=layout.row(align=True)
+        row.prop(context.scene,"ar_lod_enabled")
+        sub=row.row(align=True)
+        sub.active=context.scene.ar_lod_enabled
+        sub.prop(context.scene,"ar_lod_budget", text="Треугольников")
+        row=layout.row(align=True)
+        row.prop(context.scene,"ar_texture_max_size", text="Текстуры")
+        row.prop(context.scene,"ar_texture_format", text="")
+        sub=row.row(align=True)
+        sub.active=context.scene.ar_texture_format!='KEEP'
+        sub.prop(context.scene,"ar_texture_quality", text="")
+        memory=context.scene.get("ar_texture_memory")
+        if memory:
+            layout.label(text=format_texture_stats({"before": memory[0], "after": memory[1]}), icon='TEXTURE')
+        row=layout.row(align=True)
+        row.prop(context.scene,"ar_camera_sparse_keys")
+        sub=row.row(align=True)
+        sub.active=context.scene.ar_camera_sparse_keys
+        sub.prop(context.scene,"ar_camera_key_tolerance")
+        layout.prop(context.scene,"ar_dome_resolution")
+        layout.prop(context.scene,"ar_light_flicker")
+        if context.scene.ar_light_flicker!='OFF':
+            row=layout.row(align=True)
+            row.prop(context.scene,"ar_light_flicker_amp", text="Амплитуда")
+            row.prop(context.scene,"ar_light_flicker_freq", text="Частота")
+        row=layout.row(align=True)
+        row.operator(AR_OT_BuildScene.bl_idname)
+        row.operator(AR_OT_BuildScene.bl_idname, text="", icon='FILE_REFRESH').full_rebuild=True
+        if _active_job is not None:
+            draw_build_progress(layout, _active_job)
+        else:
+            layout.operator(AR_OT_BuildSceneAsync.bl_idname)
+        draw_profile(layout, context.scene)
 
 # ---------------------------
 # Регистрация
 # ---------------------------
-classes=[AR_OT_BuildScene, AR_PT_ScenePanel]
+classes=[AR_OT_BuildScene, AR_OT_BuildSceneAsync, AR_OT_CancelBuild, AR_OT_ScanLibrary, AR_PT_ScenePanel]
 
 def register():
     for c in classes:
         bpy.utils.register_class(c)
     register_props()
+    bpy.app.handlers.depsgraph_update_post.append(_track_geometry_updates)
 
 def unregister():
+    if _track_geometry_updates in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(_track_geometry_updates)
     for c in classes:
         bpy.utils.unregister_class(c)
     unregister_props()
+    shutdown_build_executor()
+    close_sketchfab_client()
+    close_model_library()
 
 if __name__=="__main__":
     register()
@@ -0,0 +1,46 @@
+# Аддоны — одиночные файлы для Blender, но клиент Sketchfab, кэш и библиотека
+# моделей от bpy не зависят. Вне Blender модули аддонов импортируются с
+# минимальной заменой bpy/bmesh/mathutils: только то, что нужно при импорте
+# (базовые классы операторов, фабрики свойств, декоратор обработчиков).
+# Внутри Blender (blender -b --python-expr "import pytest; pytest.main(['tests'])")
+# используются настоящие модули.
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+ADDONS = ["new", "newDome"]
+
+
+class _Properties(types.ModuleType):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def _install_blender_standins():
+    try:
+        import bpy  # noqa: F401
+        return
+    except ImportError:
+        pass
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.SimpleNamespace(Operator=object, Panel=object)
+    bpy.props = _Properties("bpy.props")
+    bpy.app = types.SimpleNamespace(handlers=types.SimpleNamespace(persistent=lambda func: func))
+    mathutils = types.ModuleType("mathutils")
+    mathutils.Vector = tuple
+    sys.modules.update(bpy=bpy, bmesh=types.ModuleType("bmesh"), mathutils=mathutils)
+
+
+_install_blender_standins()
+
+
+@pytest.fixture(params=ADDONS)
+def addon(request):
+    return importlib.import_module(request.param)
@@ -0,0 +1,87 @@
+# Манифест пакетной сборки и приведение значений ar_* к типам свойств сцены.
+import json
+import os
+import types
+
+import pytest
+
+import ar_batch
+
+
+def _write(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_csv_blank_cells_are_dropped(tmp_path):
+    path = _write(tmp_path / "jobs.csv",
+                  "prompt,video,ar_lod_budget,ar_texture_max_size,export\n"
+                  "chair,v.mp4,,1024,\n"
+                  "robot,/abs/r.mp4,5000,,1\n")
+    jobs = ar_batch.load_manifest(path)
+    assert "ar_lod_budget" not in jobs[0]
+    assert jobs[0]["ar_texture_max_size"] == "1024"
+    assert jobs[0]["export"] is False
+    assert jobs[1]["ar_lod_budget"] == "5000"
+    assert "ar_texture_max_size" not in jobs[1]
+    assert jobs[1]["export"] is True
+
+
+def test_paths_and_names(tmp_path):
+    path = _write(tmp_path / "jobs.json", json.dumps([
+        {"prompt": "red chair!", "video": "clips/a.mp4", "hdri": "sky.hdr"},
+        {"prompt": "robot", "video": "/abs/b.mp4", "name": "custom", "export": "no"},
+    ]))
+    jobs = ar_batch.load_manifest(path)
+    assert jobs[0]["video"] == os.path.join(str(tmp_path), "clips/a.mp4")
+    assert jobs[0]["hdri"] == os.path.join(str(tmp_path), "sky.hdr")
+    assert jobs[0]["name"] == "0000_red_chair"
+    assert jobs[1]["video"] == "/abs/b.mp4"
+    assert jobs[1]["name"] == "custom"
+    assert jobs[1]["export"] is False
+
+
+def test_missing_required_fields(tmp_path):
+    path = _write(tmp_path / "jobs.csv", "prompt,video\nchair,\n")
+    with pytest.raises(ValueError, match="prompt и video"):
+        ar_batch.load_manifest(path)
+
+
+@pytest.fixture
+def scene():
+    props = {
+        "ar_lod_budget": types.SimpleNamespace(type='INT'),
+        "ar_camera_key_tolerance": types.SimpleNamespace(type='FLOAT'),
+        "ar_lod_enabled": types.SimpleNamespace(type='BOOLEAN'),
+        "ar_prompt": types.SimpleNamespace(type='STRING'),
+        "ar_import_mode": types.SimpleNamespace(type='ENUM'),
+        "ar_plane_color": types.SimpleNamespace(type='FLOAT', is_array=True),
+    }
+    return types.SimpleNamespace(bl_rna=types.SimpleNamespace(properties=props))
+
+
+@pytest.mark.parametrize("key, value, expected", [
+    ("ar_lod_budget", "5000", 5000),
+    ("ar_lod_budget", 5000, 5000),
+    ("ar_camera_key_tolerance", "0.01", 0.01),
+    ("ar_lod_enabled", "yes", True),
+    ("ar_lod_enabled", "0", False),
+    ("ar_prompt", "1984", "1984"),  # число в строковом свойстве остаётся строкой
+    ("ar_import_mode", "MERGE", "MERGE"),
+    ("ar_plane_color", "0.1, 0.2 0.3", [0.1, 0.2, 0.3]),
+])
+def test_coerce_property(scene, key, value, expected):
+    coerced = ar_batch.coerce_property(scene, key, value)
+    assert coerced == expected
+    assert type(coerced) is type(expected)
+
+
+@pytest.mark.parametrize("key, value", [
+    ("ar_camera_key_tolerance", "nan"),
+    ("ar_camera_key_tolerance", "inf"),
+    ("ar_lod_budget", "12.5"),
+    ("ar_unknown", "1"),
+])
+def test_coerce_property_rejects(scene, key, value):
+    with pytest.raises(ValueError):
+        ar_batch.coerce_property(scene, key, value)
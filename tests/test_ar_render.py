@@ -0,0 +1,66 @@
+# Планировщик кусков кадров параллельного рендера: размер куска по замерам,
+# повтор упавших кадров и ожидание кусков в работе.
+import threading
+
+import pytest
+
+from ar_render import ChunkScheduler
+
+
+def _times(chunk, seconds=1.0):
+    return {f: seconds for f in chunk}
+
+
+def test_probe_then_measured_chunks():
+    sched = ChunkScheduler(range(1, 401), workers=2, probe=3)
+    first = sched.next_chunk()
+    assert first == [1, 2, 3] and sched.in_flight == 1
+    # 3 кадра по 1 с и 3 с на запуск: кусок, где запуск — 10 % времени, это 30 кадров
+    sched.finish(first, _times(first), wall=6.0)
+    assert sched.per_frame == pytest.approx(1.0) and sched.overhead == pytest.approx(3.0)
+    assert sched.next_chunk() == list(range(4, 34))
+
+
+def test_chunk_limits():
+    sched = ChunkScheduler(range(40), workers=4, probe=2, max_chunk=8)
+    chunk = sched.next_chunk()
+    sched.finish(chunk, _times(chunk, 0.01), wall=10.0)
+    assert len(sched.next_chunk()) == 8  # max_chunk
+    sched = ChunkScheduler(range(40), workers=4, probe=2)
+    chunk = sched.next_chunk()
+    sched.finish(chunk, _times(chunk, 0.01), wall=10.0)
+    assert len(sched.next_chunk()) == 10  # хвост делится между всеми процессами: 38 / 4
+
+
+def test_failed_frames_are_retried_then_dropped():
+    sched = ChunkScheduler([1, 2, 3, 4], workers=1, probe=4, retries=1)
+    chunk = sched.next_chunk()
+    sched.finish(chunk, {1: 1.0, 3: 1.0}, wall=3.0)
+    assert sched.pending == [2, 4] and sched.attempts == {2: 1, 4: 1}
+    chunk = sched.next_chunk()
+    assert chunk == [2, 4]
+    sched.finish(chunk, {4: 1.0}, wall=2.0)
+    assert sched.failed == [2] and sched.pending == []
+    assert sched.next_chunk() is None
+
+
+def test_chunk_without_frames_does_not_skew_estimate():
+    sched = ChunkScheduler(range(10), workers=1, probe=2)
+    chunk = sched.next_chunk()
+    sched.finish(chunk, {}, wall=30.0)  # процесс не запустился
+    assert sched.per_frame is None and sched.pending == list(range(10))
+
+
+def test_waits_for_chunks_in_flight():
+    sched = ChunkScheduler([1, 2], workers=2, probe=2)
+    chunk = sched.next_chunk()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(sched.next_chunk()))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()  # очередь пуста, но кусок ещё может вернуть кадры
+    sched.finish(chunk, {1: 1.0}, wall=2.0)
+    waiter.join(2.0)
+    assert got == [[2]]
+    sched.finish(got[0], {2: 1.0}, wall=2.0)
+    assert sched.next_chunk() is None and sched.in_flight == 0
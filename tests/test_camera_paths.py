@@ -0,0 +1,78 @@
+# Траектории камеры: выборка кадров (в том числе с постоянной скоростью) и
+# прореживание ключей по допуску.
+import inspect
+
+import numpy as np
+import pytest
+
+PARAMS = {"center": np.array([1.0, 2.0, 0.5]), "extents": np.array([2.0, 2.0, 3.0]),
+          "radius": 6.0, "distance": 6.0, "base_z": 1.5}
+
+
+def _params(addon, name):
+    args = inspect.signature(addon.CAMERA_PATHS[name]["fn"]).parameters
+    return {k: v for k, v in PARAMS.items() if k in args}
+
+
+@pytest.fixture
+def accelerating(addon, monkeypatch):
+    # Прямая, по которой t бежит с ускорением: x = 10 t²
+    fn = lambda t, length=10.0: np.stack((length * t * t, np.zeros_like(t), np.zeros_like(t)), axis=1)
+    monkeypatch.setitem(addon.CAMERA_PATHS, "TEST_LINE", {"fn": fn, "label": "", "description": ""})
+    return "TEST_LINE"
+
+
+def test_frames_map_to_path_fraction(addon, accelerating):
+    samples = addon.sample_camera_path(accelerating, 4, first=1, length=8.0)
+    assert np.allclose(samples[:, 0], 8.0 * (np.arange(1, 5) / 4) ** 2)
+
+
+def test_constant_speed(addon, accelerating):
+    samples = addon.sample_camera_path(accelerating, 50, constant_speed=True)
+    steps = np.diff(samples[:, 0])
+    assert np.allclose(steps, 10.0 / 50, rtol=1e-2)
+
+
+def test_constant_speed_on_still_path(addon, monkeypatch):
+    still = lambda t: np.zeros((len(t), 3))
+    monkeypatch.setitem(addon.CAMERA_PATHS, "TEST_STILL", {"fn": still, "label": "", "description": ""})
+    assert np.array_equal(addon.sample_camera_path("TEST_STILL", 10, constant_speed=True), np.zeros((10, 3)))
+
+
+def test_registered_paths(addon):
+    assert [item[0] for item in addon.camera_path_items()] == list(addon.CAMERA_PATHS)
+    for name in addon.CAMERA_PATHS:
+        for constant_speed in (False, True):
+            samples = addon.sample_camera_path(name, 120, constant_speed=constant_speed, **_params(addon, name))
+            assert samples.shape == (120, 3)
+            assert np.isfinite(samples).all()
+
+
+def test_simplify_straight_line(addon):
+    frames = np.arange(20, dtype=np.float64)
+    coords = np.stack((frames * 2.0, frames, np.zeros(20)), axis=1)
+    assert addon.simplify_path(frames, coords, 1e-6).tolist() == [0, 19]
+
+
+def test_simplify_within_tolerance(addon):
+    frames = np.arange(1, 201, dtype=np.float64)
+    coords = np.stack((np.cos(frames / 15), np.sin(frames / 15), np.sin(frames / 40) * 0.3), axis=1) * 4
+    counts = []
+    for tolerance in (0.5, 0.05, 0.01):
+        keep = addon.simplify_path(frames, coords, tolerance)
+        assert keep[0] == 0 and keep[-1] == len(frames) - 1
+        assert np.all(np.diff(keep) > 0)
+        linear = np.stack([np.interp(frames, frames[keep], coords[keep, axis]) for axis in range(3)], axis=1)
+        assert np.linalg.norm(linear - coords, axis=1).max() <= tolerance
+        counts.append(len(keep))
+    # Чем строже допуск, тем больше ключей, но всё равно меньше, чем кадров
+    assert counts == sorted(counts) and counts[-1] < len(frames)
+
+
+def test_simplify_keeps_corners(addon):
+    frames = np.arange(11, dtype=np.float64)
+    coords = np.zeros((11, 3))
+    coords[:6, 0] = np.arange(6)
+    coords[6:, 0] = 5
+    coords[6:, 1] = np.arange(1, 6)
+    assert addon.simplify_path(frames, coords, 0.01).tolist() == [0, 5, 10]
@@ -0,0 +1,135 @@
+# Кэш моделей: межпроцессная блокировка на lock-файле и разбор архива Sketchfab
+# (какой файл модели брать и какие файлы он тянет за собой).
+import json
+import os
+import struct
+import threading
+import time
+import zipfile
+
+import pytest
+
+
+def _age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_lock_is_created_and_released(addon, tmp_path):
+    path = str(tmp_path / "locks" / "model.lock")
+    with addon.file_lock(path):
+        pid, _, tail = addon._read_lock_owner(path).partition(":")
+        assert pid == str(os.getpid()) and tail
+    assert not os.path.exists(path)
+
+
+def test_stale_lock_is_taken_over(addon, tmp_path):
+    path = str(tmp_path / "model.lock")
+    with open(path, "w") as f:
+        f.write("1:dead")
+    _age(path, 60)
+    started = time.monotonic()
+    with addon.file_lock(path, timeout=5.0, stale=30.0):
+        assert addon._read_lock_owner(path) != "1:dead"
+    assert time.monotonic() - started < 1.0
+    assert not os.path.exists(path)
+
+
+def test_lock_of_another_owner_is_not_removed(addon, tmp_path):
+    path = str(tmp_path / "model.lock")
+    with addon.file_lock(path):
+        # Нас признали брошенными, блокировку взял другой процесс
+        with open(path, "w") as f:
+            f.write("1:other")
+    assert addon._read_lock_owner(path) == "1:other"
+
+
+def test_refresh_keeps_lock_alive(addon, tmp_path):
+    path = str(tmp_path / "model.lock")
+    with addon.file_lock(path, stale=0.5) as refresh:
+        _age(path, 10)
+        refresh()  # чаще раза в stale / 10 не обновляет
+        assert time.time() - os.path.getmtime(path) > 5
+        time.sleep(0.06)
+        refresh()
+        assert time.time() - os.path.getmtime(path) < 1
+
+
+def test_waiter_times_out_on_live_lock(addon, tmp_path):
+    path = str(tmp_path / "model.lock")
+    stop = threading.Event()
+    ready = threading.Event()
+
+    def holder():
+        with addon.file_lock(path, stale=0.5) as refresh:
+            ready.set()
+            while not stop.wait(0.02):
+                refresh()
+
+    thread = threading.Thread(target=holder)
+    thread.start()
+    try:
+        ready.wait(2.0)
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with addon.file_lock(path, timeout=0.1, stale=0.5, poll=0.02):
+                pass
+        # Ждущий не сдаётся раньше stale: живую блокировку могли бы счесть брошенной
+        assert time.monotonic() - started >= 0.5
+    finally:
+        stop.set()
+        thread.join()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("names, expected", [
+    (["b/scene.gltf", "scene.glb", "a/x.glb", "readme.txt"], "scene.glb"),
+    (["b/z.gltf", "a/y.GLB", "license.txt"], "a/y.GLB"),
+    (["deep/er/model.glb", "deep/model.gltf"], "deep/model.gltf"),
+])
+def test_pick_model_entry(addon, names, expected):
+    assert addon._pick_model_entry(names) == expected
+
+
+def test_pick_model_entry_without_model(addon):
+    with pytest.raises(RuntimeError, match="не найден"):
+        addon._pick_model_entry(["textures/a.png", "license.txt"])
+
+
+GLTF = {
+    "asset": {"version": "2.0"},
+    "buffers": [{"uri": "scene.bin"}, {"uri": "data:application/octet-stream;base64,AAAA"}],
+    "images": [{"uri": "textures/base%20color.png"}, {"uri": "../outside.png"},
+               {"uri": "textures/missing.png"}, {"bufferView": 0}],
+}
+
+
+def _glb(gltf):
+    data = json.dumps(gltf).encode()
+    data += b" " * (-len(data) % 4)
+    return (struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(data))
+            + struct.pack("<II", len(data), 0x4E4F534A) + data)
+
+
+@pytest.mark.parametrize("entry, payload", [
+    ("model/scene.gltf", json.dumps(GLTF).encode()),
+    ("model/scene.glb", _glb(GLTF)),
+])
+def test_referenced_members(addon, tmp_path, entry, payload):
+    path = tmp_path / "model.zip"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr(entry, payload)
+        for name in ("model/scene.bin", "model/textures/base color.png", "outside.png",
+                     "model/textures/unused.png"):
+            z.writestr(name, b"x")
+    with zipfile.ZipFile(path) as z:
+        members = addon._referenced_members(z, entry)
+    assert members == ["model/scene.bin", "model/textures/base color.png", "outside.png"]
+
+
+def test_referenced_members_rejects_broken_glb(addon, tmp_path):
+    path = tmp_path / "model.zip"
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("scene.glb", b"NOPE" + b"\0" * 16)
+    with zipfile.ZipFile(path) as z, pytest.raises(RuntimeError, match="Повреждённый GLB"):
+        addon._referenced_members(z, "scene.glb")
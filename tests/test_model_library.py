@@ -0,0 +1,106 @@
+# Локальная библиотека моделей: индексация каталогов и поиск по словам без сети.
+import json
+import os
+
+import pytest
+
+
+def _write_model(path, title=None, tags=(), parts=("Mesh",), triangles=100):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    gltf = {
+        "asset": {"version": "2.0", "extras": {"tags": list(tags)}},
+        "meshes": [{"name": part, "primitives": [{"attributes": {"POSITION": 0}}]} for part in parts],
+        "accessors": [{"count": triangles * 3, "min": [-1, 0, -1], "max": [1, 2, 1]}],
+        "nodes": [{"mesh": i, "translation": [i, 0, 0]} for i in range(len(parts))],
+        "scenes": [{"nodes": list(range(len(parts)))}],
+    }
+    if title:
+        gltf["asset"]["extras"]["title"] = title
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(gltf, f)
+    return str(path)
+
+
+@pytest.fixture
+def library(addon, tmp_path):
+    root = tmp_path / "models"
+    _write_model(root / "vehicles" / "cartoon_cat.gltf", title="Cartoon cat", tags=["cartoon"])
+    _write_model(root / "robots" / "arm.gltf", title="Industrial arm", tags=["factory"], triangles=500)
+    _write_model(root / "people" / "scene.gltf", title="Runner", parts=("Body", "Head"))
+    _write_model(root / "robots" / "mech.gltf", title="Robot mech", tags=["robot", "sci-fi"], triangles=900)
+    _write_model(root / "robots" / "small_robot.gltf", title="Small robot", tags=["robot"], triangles=200)
+    library = addon.ModelLibrary(str(tmp_path / "library.sqlite"))
+    library.root = str(root)
+    yield library
+    library.close()
+
+
+def test_scan_is_incremental(library):
+    assert library.scan([library.root]) == {"added": 5, "updated": 0, "removed": 0, "unchanged": 0, "failed": 0}
+    assert library.is_scanned(library.root)
+    path = os.path.join(library.root, "robots", "arm.gltf")
+    _write_model(path, title="Industrial arm", tags=["factory"])
+    os.utime(path, ns=(0, 1))
+    os.remove(os.path.join(library.root, "people", "scene.gltf"))
+    with open(os.path.join(library.root, "broken.gltf"), "w") as f:
+        f.write("{")
+    assert library.scan([library.root]) == {"added": 0, "updated": 1, "removed": 1, "unchanged": 3, "failed": 1}
+
+
+def test_model_info(library):
+    library.scan([library.root])
+    hit = library.search("runner")[0]
+    assert hit["name"] == "Runner"
+    assert hit["triangles"] == 200
+    assert hit["bbox"] == [[-1.0, 0.0, -1.0], [2.0, 2.0, 1.0]]
+
+
+def test_search_ranking(library):
+    library.scan([library.root])
+    # Точные совпадения в имени и тегах выше; при равенстве — легче
+    hits = library.search("robot")
+    assert [h["name"] for h in hits] == ["Small robot", "Robot mech", "Industrial arm"]
+    assert [h["exact"] for h in hits] == [True, True, False]
+    # Найдены все слова запроса — выше, чем часть слов
+    hits = library.search("robot sci")
+    assert hits[0]["name"] == "Robot mech" and hits[0]["complete"]
+    assert not hits[-1]["complete"]
+    assert library.search("  ") == []
+
+
+@pytest.mark.parametrize("query", [
+    "car",        # только начало слова cartoon
+    "body",       # имя части модели, а не имя или тег
+    "robot arm",  # robot у Industrial arm — только каталог
+    "zebra",
+])
+def test_lookup_requires_exact_name_or_tag(library, query):
+    library.scan([library.root])
+    assert library.lookup(query) is None
+
+
+@pytest.mark.parametrize("query, name", [
+    ("robot", "Small robot"),
+    ("robot mech", "Robot mech"),
+    ("Industrial ARM", "Industrial arm"),
+])
+def test_lookup(library, query, name):
+    library.scan([library.root])
+    assert library.lookup(query)["name"] == name
+
+
+def test_lookup_drops_deleted_files(library):
+    library.scan([library.root])
+    os.remove(os.path.join(library.root, "robots", "small_robot.gltf"))
+    assert library.lookup("robot")["name"] == "Robot mech"
+    assert [h["name"] for h in library.search("small")] == []
+
+
+def test_add_downloaded_model(library, tmp_path):
+    path = _write_model(tmp_path / "cache" / "abc" / "scene.gltf", title="Red chair", tags=["furniture"])
+    library.add(path, name="Red chair", tags=["chair"], uid="abc")
+    hit = library.lookup("chair")
+    assert (hit["uid"], hit["source"], hit["tags"]) == ("abc", "sketchfab", ["chair", "furniture"])
+    # Повторная индексация каталогов не трогает скачанные модели
+    library.scan([library.root])
+    assert library.lookup("red chair")["uid"] == "abc"
@@ -0,0 +1,114 @@
+# Сервер предпросмотра newDome.py: диапазоны, ETag/304 и gzip с Vary.
+import gzip
+import http.client
+import importlib
+
+import pytest
+
+BODY = bytes(range(256)) * 40
+HTML = b"<html>" + b"AR preview " * 400 + b"</html>"
+
+
+@pytest.fixture(scope="module")
+def addon():
+    return importlib.import_module("newDome")
+
+
+@pytest.fixture
+def server(addon, tmp_path):
+    (tmp_path / "ar_model.glb").write_bytes(BODY)
+    (tmp_path / "index.html").write_bytes(HTML)
+    server = addon.PreviewServer(str(tmp_path), port=0)
+    yield server
+    server.shutdown()
+    addon._gzip_cache.clear()
+
+
+@pytest.fixture
+def get(server):
+    def get(path, **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", server.httpd.server_address[1], timeout=5)
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.headers, response.read()
+        finally:
+            conn.close()
+    return get
+
+
+def test_full_response(get):
+    status, headers, body = get("/ar_model.glb")
+    assert status == 200 and body == BODY
+    assert headers["Content-Length"] == str(len(BODY))
+    assert headers["Accept-Ranges"] == "bytes"
+    assert headers["ETag"].startswith('"') and "Vary" not in headers
+
+
+@pytest.mark.parametrize("spec, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=10000-", 10000, len(BODY) - 1),
+    ("bytes=-100", len(BODY) - 100, len(BODY) - 1),
+    ("bytes=100-999999", 100, len(BODY) - 1),
+])
+def test_range(get, spec, start, end):
+    status, headers, body = get("/ar_model.glb", Range=spec)
+    assert status == 206
+    assert headers["Content-Range"] == f"bytes {start}-{end}/{len(BODY)}"
+    assert body == BODY[start:end + 1]
+
+
+def test_unsatisfiable_range(get):
+    status, headers, body = get("/ar_model.glb", Range=f"bytes={len(BODY)}-")
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(BODY)}"
+    assert body == b""
+
+
+@pytest.mark.parametrize("spec", ["bytes=0-1,5-6", "items=0-1", "bytes=a-b"])
+def test_unsupported_range_sends_everything(get, spec):
+    status, _, body = get("/ar_model.glb", Range=spec)
+    assert status == 200 and body == BODY
+
+
+def test_if_range(get):
+    etag = get("/ar_model.glb")[1]["ETag"]
+    assert get("/ar_model.glb", Range="bytes=0-9", **{"If-Range": etag})[0] == 206
+    status, _, body = get("/ar_model.glb", Range="bytes=0-9", **{"If-Range": '"old"'})
+    assert status == 200 and body == BODY
+
+
+def test_not_modified(get):
+    etag = get("/ar_model.glb")[1]["ETag"]
+    for tags in (etag, "W/" + etag, f'"old", {etag}', "*"):
+        status, headers, body = get("/ar_model.glb", **{"If-None-Match": tags})
+        assert status == 304 and body == b""
+        assert headers["ETag"] == etag
+    assert get("/ar_model.glb", **{"If-None-Match": '"old"'})[0] == 200
+
+
+def test_gzip_has_own_etag(get):
+    status, plain, body = get("/")
+    assert status == 200 and body == HTML
+    status, packed, body = get("/", **{"Accept-Encoding": "gzip"})
+    assert status == 200 and gzip.decompress(body) == HTML
+    assert packed["Content-Encoding"] == "gzip"
+    assert packed["ETag"] != plain["ETag"] and packed["ETag"].endswith('-gzip"')
+    assert plain["Vary"] == packed["Vary"] == "Accept-Encoding"
+    # Тег несжатого ответа не подходит к сжатому и наоборот
+    assert get("/", **{"Accept-Encoding": "gzip", "If-None-Match": plain["ETag"]})[0] == 200
+    assert get("/", **{"If-None-Match": packed["ETag"]})[0] == 200
+    status, headers, _ = get("/", **{"Accept-Encoding": "gzip", "If-None-Match": packed["ETag"]})
+    assert status == 304 and headers["Vary"] == "Accept-Encoding"
+
+
+def test_missing_file(get):
+    assert get("/nope.glb")[0] == 404
+
+
+def test_events_carry_file(server):
+    events = server.events
+    version = events.version
+    events.publish("ar_model_lite.glb")
+    assert events.wait(version, timeout=1.0) == version + 1
+    assert events.filename == "ar_model_lite.glb"
@@ -0,0 +1,104 @@
+# SketchfabClient против локальной подмены API (benchmarks/sketchfab_stub.py):
+# повторы на 5xx/429, таймауты и TTL кэша поиска (память и диск).
+import time
+
+import pytest
+
+from sketchfab_stub import SketchfabStub
+
+MODELS = {
+    "robot01": {"zip": "", "name": "Robot", "tags": ["robot", "mech"], "faceCount": 1200},
+    "chair01": {"zip": "", "name": "Red chair", "tags": ["chair"], "faceCount": 300},
+}
+
+
+@pytest.fixture
+def stub():
+    stub = SketchfabStub(MODELS)
+    yield stub
+    stub.shutdown()
+
+
+@pytest.fixture
+def make_client(addon, stub, tmp_path):
+    clients = []
+
+    def make(**kwargs):
+        kwargs.setdefault("backoff", 0.01)
+        kwargs.setdefault("cache_path", str(tmp_path / "search_cache.json"))
+        client = addon.SketchfabClient(api_url=stub.api_url, token="", **kwargs)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.mark.parametrize("statuses", [(503,), (429,), (500, 502, 504)])
+def test_search_retries_transient_errors(stub, make_client, statuses):
+    stub.fail("search", *statuses)
+    results = make_client(retries=3).search("robot")
+    assert [r["uid"] for r in results] == ["robot01"]
+    assert results[0]["tags"] == ["robot", "mech"]
+    assert stub.requests["search"] == len(statuses) + 1
+
+
+def test_search_gives_up_after_retries(stub, make_client):
+    stub.fail("search", 503, 503, 503, 503)
+    with pytest.raises(RuntimeError, match="Ошибка API Sketchfab"):
+        make_client(retries=2).search("robot")
+    assert stub.requests["search"] == 3
+
+
+def test_download_url_retries(stub, make_client):
+    stub.fail("download", 429)
+    url = make_client(retries=1).gltf_download_url("robot01")
+    assert url.endswith("/cdn/robot01.zip")
+    assert stub.requests["download"] == 2
+
+
+def test_client_errors_are_not_retried(stub, make_client):
+    with pytest.raises(RuntimeError, match="ссылки на скачивание"):
+        make_client(retries=3).gltf_download_url("missing")
+    assert stub.requests["download"] == 1
+
+
+def test_read_timeout(stub, make_client):
+    stub.latency = 1.0
+    client = make_client(retries=0, timeout=(1.0, 0.2))
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="Sketchfab недоступен"):
+        client.search("robot", use_cache=False)
+    assert time.monotonic() - started < 0.9
+
+
+def test_search_cache_hit(stub, make_client):
+    client = make_client()
+    first = client.search("Robot")
+    assert client.search("  robot ") == first  # ключ кэша нормализуется
+    assert stub.requests["search"] == 1
+    # Новый клиент (перезапуск Blender) берёт результат из кэша на диске
+    assert make_client().search("robot") == first
+    assert stub.requests["search"] == 1
+
+
+def test_search_cache_expires(stub, make_client):
+    client = make_client(search_ttl=0.3)
+    client.search("robot")
+    client.search("robot")
+    assert stub.requests["search"] == 1
+    time.sleep(0.4)
+    client.search("robot")
+    assert stub.requests["search"] == 2
+    # Просроченная запись на диске тоже не используется
+    time.sleep(0.4)
+    make_client(search_ttl=0.3).search("robot")
+    assert stub.requests["search"] == 3
+
+
+def test_search_without_cache(stub, make_client):
+    client = make_client()
+    client.search("chair")
+    client.search("chair", use_cache=False)
+    assert stub.requests["search"] == 2